@@ -0,0 +1,188 @@
+"""Steps every map in data/maps headlessly and reports simulation speed, per-subsystem time and allocations.
+
+usage: python benchmark.py [--ticks N] [--seed S] [--render] [--script FILE] [--batch-enemies] [--json] [maps ...]
+       python benchmark.py --physics [--ticks N] [maps ...]   (player and enemy physics step only)
+"""
+import os
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+"""The banner pygame prints on import would end up in the --json output"""
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from game import Game
+from scripts.mapformat import map_ids
+from scripts.inputlog import ACTIONS
+
+
+def random_input(seed, rate=0.1):
+    """Yields the list of actions for each tick, chosen at random."""
+    rng = random.Random(seed)
+    while True:
+        yield [rng.choice(ACTIONS)] if rng.random() < rate else []
+
+
+def scripted_input(path):
+    """Yields per-tick actions from a JSON file of [tick, action] pairs, then no input."""
+    with open(path, 'r') as f:
+        script = json.load(f)
+    by_tick = {}
+    for tick, action in script:
+        by_tick.setdefault(tick, []).append(action)
+    tick = 0
+    while True:
+        yield by_tick.get(tick, [])
+        tick += 1
+
+
+def run_map(game, map_id, ticks, inputs, render=False):
+    """Loads a map and steps it for the given number of ticks. Returns the measurements as a dict."""
+    game.level = map_id
+    game.lives = 3
+    game.load_level(map_id)
+    game.profiler.reset()
+    game.profiler.enabled = True
+
+    gc.collect()
+    collections_before = sum(stat['collections'] for stat in gc.get_stats())
+    blocks_before = sys.getallocatedblocks()
+    start = time.perf_counter()
+    for tick in range(ticks):
+        game.actions.extend(next(inputs))
+        game.update()
+        """Keep the run on this map instead of falling back to level 0 after the last life"""
+        game.lives = max(game.lives, 2)
+        if render:
+            game.profiler.begin('render')
+            game.render()
+            game.profiler.end('render')
+    elapsed = time.perf_counter() - start
+    blocks_after = sys.getallocatedblocks()
+    collections_after = sum(stat['collections'] for stat in gc.get_stats())
+    game.profiler.enabled = False
+
+    return {
+        'map': map_id,
+        'ticks': ticks,
+        'seconds': elapsed,
+        'ticks_per_second': ticks / elapsed if elapsed else float('inf'),
+        'stages_us_per_tick': {name: total / 1000 / ticks for name, total in game.profiler.totals.items()},
+        'allocated_blocks_delta': blocks_after - blocks_before,
+        'gc_collections': collections_after - collections_before,
+        'final_level': game.level,
+        'enemies_left': len(game.enemies),
+    }
+
+
+def run_physics(game, map_id, ticks):
+    """Steps only the player and enemy updates of a map and measures time and memory allocated per tick.
+
+    The player runs back and forth and the enemies patrol, without input, dashing or the rest of the game
+    update; projectiles and sparks from enemy shots are dropped each tick. A tick's transient allocations
+    are the peak traced memory above what was in use before it.
+    """
+    game.level = map_id
+    game.load_level(map_id)
+    tilemap = game.tilemap
+    player = game.player
+    enemies = game.enemies
+
+    def tick(i):
+        player.update(tilemap, (1 if i // 90 % 2 else -1, 0))
+        game.dead = 0
+        for enemy in enemies:
+            enemy.update(tilemap, (0, 0))
+        if len(game.projectiles):
+            game.projectiles.clear()
+            game.sparks.clear()
+
+    for i in range(60):
+        tick(i)
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    start = time.perf_counter()
+    for i in range(ticks):
+        tick(i)
+    elapsed = time.perf_counter() - start
+    blocks_after = sys.getallocatedblocks()
+
+    transient = []
+    tracemalloc.start()
+    for i in range(ticks):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        tick(i)
+        transient.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    return {
+        'map': map_id,
+        'ticks': ticks,
+        'entities': 1 + len(enemies),
+        'us_per_entity_tick': elapsed / ticks / (1 + len(enemies)) * 1e6,
+        'transient_bytes_mean': sum(transient) / ticks,
+        'transient_bytes_max': max(transient),
+        'allocated_blocks_delta': blocks_after - blocks_before,
+    }
+
+
+def print_physics_report(results):
+    for result in results:
+        print(f"map {result['map']}: {result['entities']} entities, {result['us_per_entity_tick']:.1f} us per entity "
+              f"tick, transient allocations {result['transient_bytes_mean']:.0f} bytes/tick on average "
+              f"({result['transient_bytes_max']} max), allocated blocks {result['allocated_blocks_delta']:+d}")
+
+
+def print_report(results):
+    for result in results:
+        print(f"map {result['map']}: {result['ticks']} ticks in {result['seconds']:.3f}s "
+              f"({result['ticks_per_second']:.0f} ticks/s), allocated blocks {result['allocated_blocks_delta']:+d}, "
+              f"gc collections {result['gc_collections']}")
+        for name, us in sorted(result['stages_us_per_tick'].items(), key=lambda item: -item[1]):
+            print(f'    {name:<12} {us:9.1f} us/tick')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('maps', nargs='*', type=int, help='map IDs to run (default: all)')
+    parser.add_argument('--ticks', type=int, default=3600)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--render', action='store_true', help='also render every tick (without presenting)')
+    parser.add_argument('--script', help='JSON file of [tick, action] pairs to use instead of random input')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--physics', action='store_true', help='micro-benchmark the entity physics step instead')
+    parser.add_argument('--batch-enemies', action='store_true',
+                        help='update enemies with the batch EnemySystem instead of one Enemy.update call each')
+    args = parser.parse_args()
+
+    game = Game(headless=True)
+    game.in_menu = False
+    game.batch_enemies = args.batch_enemies
+    if args.physics:
+        game.seed(args.seed)
+        results = [run_physics(game, map_id, args.ticks) for map_id in args.maps or map_ids()]
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print_physics_report(results)
+        return
+
+    results = []
+    for map_id in args.maps or map_ids():
+        game.seed(args.seed)
+        inputs = scripted_input(args.script) if args.script else random_input(args.seed)
+        results.append(run_map(game, map_id, args.ticks, inputs, render=args.render))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
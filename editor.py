@@ -7,6 +7,7 @@ import pygame
 
 from scripts.utils import load_images
 from scripts.tilemap import Tilemap
+from scripts.presenter import Presenter
 
 RENDER_SCALE = 2.0
 
@@ -17,6 +18,7 @@ class Editor:
 
         pygame.display.set_caption('editor')
         self.screen = pygame.display.set_mode((640, 480))
+        self.presenter = Presenter(self.screen)
         self.display = pygame.Surface((320, 240))
 
         self.clock = pygame.time.Clock()
@@ -43,6 +45,7 @@ class Editor:
         self.right_clicking = False
         self.shift = False
         self.ongrid = True
+        self.autotiling = False
 
         self.spawn_point = None
 
@@ -78,9 +81,9 @@ class Editor:
         map_file_path = f'data/maps/{map_number}.json'
         self.tilemap.save(map_file_path)
         map_data = {
-            'tilemap': self.tilemap.tilemap,
+            'tilemap': self.tilemap.tilemap.to_dict(),
             'tile_size': self.tilemap.tile_size,
-            'offgrid': self.tilemap.offgrid_tiles,
+            'offgrid': self.tilemap.offgrid_tiles.copy(),
             'spawn_point': self.spawn_point
         }
         with open(f'data/maps/{map_number}.json', 'w') as f:
@@ -116,18 +119,18 @@ class Editor:
                 self.display.blit(current_tile_img, mpos)
 
             if self.clicking and self.ongrid:
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {
-                    'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': tile_pos}
+                tile_type = self.tile_list[self.tile_group]
+                if not self.autotiling:
+                    self.tilemap.set_tile(tile_pos[0], tile_pos[1], tile_type, self.tile_variant)
+                elif self.tilemap.tile_type_at(*tile_pos) != tile_type:
+                    """Only re-autotile when the cell changes, not every frame the button is held"""
+                    self.tilemap.set_tile(tile_pos[0], tile_pos[1], tile_type, self.tile_variant)
+                    self.tilemap.autotile_around(*tile_pos)
             if self.right_clicking:
-                tile_loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
-                for tile in self.tilemap.offgrid_tiles.copy():
-                    tile_img = self.assets[tile['type']][tile['variant']]
-                    tile_r = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1],
-                                         tile_img.get_width(), tile_img.get_height())
-                    if tile_r.collidepoint(mpos):
-                        self.tilemap.offgrid_tiles.remove(tile)
+                if self.tilemap.remove_tile(tile_pos[0], tile_pos[1]) and self.autotiling:
+                    self.tilemap.autotile_around(*tile_pos)
+                for tile in self.tilemap.offgrid_at((mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])):
+                    self.tilemap.offgrid_tiles.remove(tile)
 
             self.display.blit(current_tile_img, (5, 5))
 
@@ -188,6 +191,9 @@ class Editor:
                         self.ongrid = not self.ongrid
                     if event.key == pygame.K_t:
                         self.tilemap.autotile()
+                    if event.key == pygame.K_y:
+                        self.autotiling = not self.autotiling
+                        print(f"Autotiling while painting {'on' if self.autotiling else 'off'}")
                     if event.key == pygame.K_n:
                         map_number = self.get_next_map_number()
                         self.create_new_map()
@@ -216,8 +222,8 @@ class Editor:
                 self.display.blit(spawn_indicator, (self.spawn_point[0] * self.tilemap.tile_size - self.scroll[0],
                                                     self.spawn_point[1] * self.tilemap.tile_size - self.scroll[1]))
 
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
-            pygame.display.update()
+            self.presenter.scale(self.display)
+            self.presenter.present()
             self.clock.tick(60)
 
 
@@ -1,32 +1,85 @@
 import os
 import sys
 import math
-import random
+import time
+import argparse
 
 import pygame
 
-from scripts.utils import load_image, load_images, Animation
+from scripts.utils import load_image, load_images, Animation, SilentSound, LazySound
 from scripts.entities import Player, Enemy
-from scripts.tilemap import Tilemap
+from scripts.tilemap import CHUNK_SIZE
+from scripts.streaming import StreamingTilemap, open_map
+from scripts.mapformat import map_path, map_ids
 from scripts.clouds import Clouds
-from scripts.particle import Particle
-from scripts.spark import Spark
+from scripts.particle import ParticleSystem
+from scripts.spark import SparkSystem
+from scripts.projectile import ProjectileSystem
+from scripts.enemy_system import EnemySystem
+from scripts.profiler import Profiler
+from scripts.shadow import ShadowRenderer
+from scripts.render_cache import RenderCache
+from scripts.spatial import EntityGrid
+from scripts.loader import BackgroundLoader
+from scripts.presenter import Presenter
+from scripts.rng import RandomStreams
+from scripts.inputlog import InputRecorder
 from menu import Menu
 
+TICK_RATE = 60
+MAX_TICKS_PER_FRAME = 5
+MAX_FPS = 240
+"""The menu only redraws when it changes, so it doesn't need to poll its input more often than this"""
+MENU_FPS = 30
+PROFILE_TRACE_PATH = 'profile_trace.json'
+SOUND_NAMES = ['jump', 'dash', 'hit', 'shoot', 'ambience']
+LOADING_SCREEN_MIN_MS = 500
+DEATH_SCREEN_MS = 1000
+OVERLAY_POLL_MS = 50
+"""Advance enemies with the batch EnemySystem instead of one Enemy.update call each. Off by default: the batch
+path gives the same results but measured no faster than the Enemy objects (see benchmark.py --batch-enemies)"""
+BATCH_ENEMIES = False
+
 
 class Game:
-    """ Initializes the game, setting up the display, loading assets , initializing game entities """
-    def __init__(self):
+    """ Initializes the game, setting up the display, loading assets , initializing game entities
+
+    With headless=True the game runs on SDL's dummy video and audio drivers: nothing is presented to the
+    screen, sounds are silent and levels load without the loading/death overlays, so they can be stepped tick
+    by tick as fast as possible (see benchmark.py).
+
+    Sounds, music and maps are read on a background loader thread so the menu comes up right away and the
+    main loop keeps running while the loading overlay shows the loader's progress.
+
+    All randomness comes from the seeded streams in self.rng. With 'record' set to a path, the session
+    started from the menu is recorded there as an input log (see scripts/inputlog.py) that replay.py can
+    re-run exactly.
+    """
+    def __init__(self, headless=False, seed=None, record=None):
+        self.headless = headless
+        self.record_path = record
+        self.recorder = None
+        self.rng = RandomStreams(seed)
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
         pygame.init()
 
         pygame.display.set_caption('Enemy Eclipse')
         self.screen = pygame.display.set_mode((840, 580))
+        self.presenter = Presenter(self.screen)
         self.display = pygame.Surface((320, 240), pygame.SRCALPHA)
         self.display_2 = pygame.Surface((320, 240))
 
         self.clock = pygame.time.Clock()
 
         self.movement = [False, False]
+        self.actions = []
+        self.interpolate = True
+        self.render_alpha = 1
+        self.profiler = Profiler()
+        self.render_cache = RenderCache()
+        self.show_profiler = False
 
         self.assets = {
             'decor': load_images('tiles/decor'),
@@ -49,13 +102,15 @@ class Game:
             'projectile': load_image('projectile.png'),
         }
 
-        self.sfx = {
-            'jump': pygame.mixer.Sound('data/sfx/jump.wav'),
-            'dash': pygame.mixer.Sound('data/sfx/dash.wav'),
-            'hit': pygame.mixer.Sound('data/sfx/hit.wav'),
-            'shoot': pygame.mixer.Sound('data/sfx/shoot.wav'),
-            'ambience': pygame.mixer.Sound('data/sfx/ambience.wav'),
-        }
+        self.loader = BackgroundLoader()
+        if headless:
+            self.sfx = {name: SilentSound() for name in SOUND_NAMES}
+        else:
+            self.sfx = {}
+            for name in SOUND_NAMES:
+                path = 'data/sfx/' + name + '.wav'
+                self.sfx[name] = LazySound(self.loader.submit('sfx/' + name, pygame.mixer.Sound, path, optional=True),
+                                             self.loader)
 
         self.sfx['ambience'].set_volume(0.2)
         self.sfx['shoot'].set_volume(0.4)
@@ -63,34 +118,76 @@ class Game:
         self.sfx['dash'].set_volume(0.3)
         self.sfx['jump'].set_volume(0.8)
 
-        self.clouds = Clouds(self.assets['clouds'], count=16)
+        self.clouds = Clouds(self.assets['clouds'], count=16, rng=self.rng.clouds)
 
         self.player = Player(self, (50, 50), (8, 15))
+        self.entity_grid = EntityGrid()
 
-        self.tilemap = Tilemap(self, tile_size=16)
+        self.tilemap = StreamingTilemap(self, tile_size=16)
+        self.tilemap.on_load = self.activate_chunk
+        self.tilemap.on_unload = self.deactivate_chunk
+        self.shadows = ShadowRenderer(self.tilemap)
+
+        self.particles = ParticleSystem(self)
+        self.sparks = SparkSystem()
+        self.projectiles = ProjectileSystem(self.assets['projectile'], tile_size=self.tilemap.tile_size)
+        self.enemy_system = EnemySystem(self)
+        self.batch_enemies = BATCH_ENEMIES
 
         self.menu = Menu(self.screen, self)
 
         self.level = 0
         self.lives = 3
         self.lives_font = pygame.font.Font(None, 24)
+        self.heart_font = pygame.font.SysFont('segoeuisymbol', 20)
+        self.heart_emoji = '❤️'
+        self.profiler_font = pygame.font.Font(None, 18)
+        self.indicator_font = pygame.font.Font(None, 36)
 
         self.screenshake = 0
         self.level_indicator_shown = False
         self.in_menu = True
-        self.show_level_loading = False
+        self.overlay = None
+        self.overlay_text = None
+        self.overlay_until = 0
+        self.overlay_drawn = None
+        self.next_map = None
+        self.level_pending = False
 
         self.spawn_point = None
 
-    def load_level(self, map_id):
-        """Loads a game level, setting up the environment, player position, enemies, and other entities."""
-        self.show_level_indicator(self.level)
-
-        self.tilemap.load('data/maps/' + str(map_id) + '.json')
-
+    def seed(self, seed=None):
+        """Restarts every random stream from the given seed (a new random one if None) and redraws the clouds"""
+        self.rng.seed(seed)
+        self.clouds = Clouds(self.assets['clouds'], count=16, rng=self.rng.clouds)
+
+    def start_recording(self):
+        """Starts recording the input of the session from a fresh seed"""
+        self.seed()
+        self.recorder = InputRecorder(self.rng.base_seed, self.level, self.lives)
+
+    def save_recording(self):
+        if self.recorder is not None:
+            self.recorder.save(self.record_path)
+
+    def load_level(self, map_id, map_data=None):
+        """Loads a game level, setting up the environment, player position, enemies, and other entities.
+
+        'map_data' is the map already opened by open_map (see start_level); otherwise it is opened here.
+        Binary maps are streamed, and the enemies and leaf emitters of each chunk are activated when the
+        chunk is streamed in (see activate_chunk).
+        """
+        if map_data is None:
+            map_data = open_map(map_path(map_id))
+        self.level_pending = False
+        self.tilemap.load_data(map_data)
+        self.projectiles.tile_size = self.tilemap.tile_size
+
+        self.leaf_emitters = {}
         self.leaf_spawners = []
-        for tree in self.tilemap.extract([('large_decor', 2)], keep=True):
-            self.leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13))
+        self.enemies = []
+        self.parked_enemies = {}
+        self.unspawned_chunks = set()
 
         """ Position the player at the spawn point"""
         if self.spawn_point:
@@ -99,261 +196,458 @@ class Game:
             """Default position if spawn_point is not set"""
             self.player.pos = [50, 50]
 
-        self.enemies = []
-        for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1)]):
-            if spawner['variant'] == 0:
+        self.scroll = [0, 0]
+        self.last_scroll = [0, 0]
+
+        if self.tilemap.streaming:
+            map_file = self.tilemap.map_file
+            self.unspawned_chunks = {key for key, order, tile in map_file.find_offgrid('spawners', 1)}
+            for key, order, spawner in map_file.find_offgrid('spawners', 0):
                 self.player.pos = spawner['pos']
                 self.player.air_time = 0
-            else:
-                self.enemies.append(Enemy(self, spawner['pos'], (8, 15)))
-
-        self.projectiles = []
-        self.particles = []
-        self.sparks = []
+            self.stream_world()
+        else:
+            self.activate_chunk(None)
 
-        self.scroll = [0, 0]
-        self.dead = 0
-        self.transition = -30
+        self.projectiles.clear()
+        self.particles.clear()
+        self.sparks.clear()
 
-    def show_level_indicator(self, level):
-        """ Displays a level loading indicator on the screen"""
-        indicator_font = pygame.font.Font(None, 36)
-        indicator_text = f"Level {level + 1} loading ..."
+        self.player.last_pos = list(self.player.pos)
 
-        white = (255, 255, 255)
-        text_surface = indicator_font.render(indicator_text, True, white)
-        text_rect = text_surface.get_rect(center=(self.screen.get_width() // 2, self.screen.get_height() // 2))
-
-        background = pygame.Surface(self.screen.get_size())
-        background.fill((0, 0, 0))
-        background.blit(text_surface, text_rect)
-        self.screen.blit(background, (0, 0))
-        pygame.display.flip()
-        self.show_level_loading = True
-
-        start_time = pygame.time.get_ticks()
-        while pygame.time.get_ticks() - start_time < 500:
-            pygame.event.pump()
-
-    def run_level_indicator(self):
-        """Manages the transition between levels, showing the level loading indicator."""
-        self.transition = 0
         self.dead = 0
+        self.transition = -30
 
-        """ Check if the level loading indicator should be shown"""
-        if self.show_level_loading:
-            indicator_font = pygame.font.Font(None, 36)
-            indicator_text = f"Level {self.level + 1} loading ..."
-
-            white = (255, 255, 255)
-            text_surface = indicator_font.render(indicator_text, True, white)
-            text_rect = text_surface.get_rect(center=(self.screen.get_width() // 2, self.screen.get_height() // 2))
-
-            background = pygame.Surface(self.screen.get_size())
-            background.fill((0, 0, 0))
-            background.blit(text_surface, text_rect)
-            self.screen.blit(background, (0, 0))
-            pygame.display.flip()
-
-            start_time = pygame.time.get_ticks()
-            while pygame.time.get_ticks() - start_time < 500:
-                pygame.event.pump()
-
-            self.show_level_loading = False
-
-        self.load_level(self.level)
-
-    def show_death_indicator(self):
-        """Displays death indicator on screen"""
-        indicator_font = pygame.font.Font(None, 36)
-        indicator_text = "You died!"
+    def activate_chunk(self, key):
+        """Starts the leaf emitters and enemies of a chunk that was streamed in, or of the whole map (None)"""
+        trees = self.tilemap.extract([('large_decor', 2)], keep=True, chunk=key)
+        self.leaf_emitters[key] = [pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13) for tree in trees]
+        self.leaf_spawners = [rect for rects in self.leaf_emitters.values() for rect in rects]
 
-        red = (255, 0, 0)
-        text_surface = indicator_font.render(indicator_text, True, red)
-        text_rect = text_surface.get_rect(center=(self.screen.get_width() // 2, self.screen.get_height() // 2))
+        self.enemies += self.parked_enemies.pop(key, [])
+        self.unspawned_chunks.discard(key)
+        for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1)], chunk=key):
+            if spawner['variant'] == 0:
+                self.player.pos = spawner['pos']
+                self.player.air_time = 0
+            else:
+                self.enemies.append(Enemy(self, spawner['pos'], (8, 15)))
 
-        background = pygame.Surface(self.screen.get_size())
-        background.fill((0, 0, 0))
-        background.blit(text_surface, text_rect)
-        self.screen.blit(background, (0, 0))
-        pygame.display.flip()
+    def deactivate_chunk(self, key):
+        """Stops the leaf emitters of a chunk that is being streamed out and parks the enemies standing in it"""
+        if self.leaf_emitters.pop(key, None):
+            self.leaf_spawners = [rect for rects in self.leaf_emitters.values() for rect in rects]
+
+        chunk_px = CHUNK_SIZE * self.tilemap.tile_size
+        parked = [enemy for enemy in self.enemies
+                  if (int(enemy.pos[0] // chunk_px), int(enemy.pos[1] // chunk_px)) == key]
+        if parked:
+            self.parked_enemies.setdefault(key, []).extend(parked)
+            self.enemies = [enemy for enemy in self.enemies if enemy not in parked]
+
+    def stream_world(self):
+        """Streams in the chunks around the camera and the player"""
+        view = (self.scroll[0], self.scroll[1], self.display.get_width(), self.display.get_height())
+        player = (self.player.pos[0], self.player.pos[1], self.player.size[0], self.player.size[1])
+        self.tilemap.stream((view, player))
+
+    def start_level(self, level, after_death=False):
+        """Moves to a level behind the level loading overlay, preceded by the death overlay if after_death.
+
+        The map is read on the loader thread while the overlays show, so the main loop keeps running and the
+        level is ready when they end. Headless games load it at the start of the next tick, so in either case
+        the tick that changed the level finishes on the old one and a recorded session replays the same.
+        """
+        self.level = level
+        if self.headless:
+            self.level_pending = True
+            return
+
+        self.next_map = self.loader.submit(f'map {level + 1}', open_map, map_path(level))
+        if after_death:
+            self.show_overlay('death', "You died!", (255, 0, 0), DEATH_SCREEN_MS)
+        else:
+            self.show_overlay('loading', f"Level {level + 1} loading ...", (255, 255, 255), LOADING_SCREEN_MIN_MS)
+
+    def show_overlay(self, kind, text, color, duration):
+        """Covers the game with a full screen message ('loading' or 'death') for at least duration ms"""
+        self.overlay = kind
+        self.overlay_text = self.render_cache.text(self.indicator_font, text, color)
+        self.overlay_until = pygame.time.get_ticks() + duration
+        self.overlay_drawn = None
+
+    def update_overlay(self):
+        """Runs one frame of the current overlay.
+
+        The screen is only redrawn when the loader's progress changed, and the rest of the frame is spent
+        sleeping on the loader or the clock. Once the overlay is over it moves on to the next one or the level.
+        """
+        if pygame.event.peek(pygame.QUIT):
+            self.save_recording()
+            pygame.quit()
+            sys.exit()
+
+        done, total, current = self.loader.progress()
+        if self.overlay != 'loading':
+            done, total, current = 0, 0, None
+        state = (self.overlay, done, total, current)
+        if state != self.overlay_drawn:
+            self.overlay_drawn = state
+            self.draw_overlay(done, total, current)
+
+        remaining = self.overlay_until - pygame.time.get_ticks()
+        if current is None and remaining <= 0:
+            self.finish_overlay()
+        elif current is None:
+            pygame.time.wait(min(remaining, OVERLAY_POLL_MS))
+        else:
+            self.loader.wait(timeout=OVERLAY_POLL_MS / 1000)
 
-        start_time = pygame.time.get_ticks()
-        while pygame.time.get_ticks() - start_time < 1000:
-            pygame.event.pump()
+    def draw_overlay(self, done, total, current):
+        white = (255, 255, 255)
+        center = (self.screen.get_width() // 2, self.screen.get_height() // 2)
+        text_rect = self.overlay_text.get_rect(center=center)
+
+        self.screen.fill((0, 0, 0))
+        self.screen.blit(self.overlay_text, text_rect)
+        if total:
+            bar = pygame.Rect(0, 0, 240, 6)
+            bar.midtop = (center[0], text_rect.bottom + 16)
+            pygame.draw.rect(self.screen, white, bar, 1)
+            pygame.draw.rect(self.screen, white, (bar.x, bar.y, bar.width * done // total, bar.height))
+            if current:
+                label = self.render_cache.text(self.profiler_font, current, white)
+                self.screen.blit(label, label.get_rect(midtop=(center[0], bar.bottom + 6)))
+        self.presenter.damage()
+        self.presenter.present()
+
+    def finish_overlay(self):
+        if self.overlay == 'death':
+            self.show_overlay('loading', f"Level {self.level + 1} loading ...", (255, 255, 255),
+                              LOADING_SCREEN_MIN_MS)
+            return
+        """A failed background load (missing sound or map) surfaces here"""
+        self.loader.check()
+        self.overlay = None
+        self.load_level(self.level, self.next_map.result())
+        self.next_map = None
+
+    def handle_events(self):
+        """Handles quitting and turns key presses/releases into actions for the next simulation tick"""
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.save_recording()
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F3:
+                    self.toggle_profiler()
+                if event.key == pygame.K_F4 and self.profiler.enabled:
+                    self.profiler.export_trace(PROFILE_TRACE_PATH)
+                if event.key == pygame.K_LEFT:
+                    self.actions.append('left_down')
+                if event.key == pygame.K_RIGHT:
+                    self.actions.append('right_down')
+                if event.key == pygame.K_UP:
+                    self.actions.append('jump')
+                if event.key == pygame.K_x:
+                    self.actions.append('dash')
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_LEFT:
+                    self.actions.append('left_up')
+                if event.key == pygame.K_RIGHT:
+                    self.actions.append('right_up')
+
+    def toggle_profiler(self):
+        """Turns the frame profiler and its on-screen overlay on or off (F3); F4 exports a trace while it runs"""
+        self.show_profiler = not self.show_profiler
+        self.profiler.reset()
+        self.profiler.enabled = self.show_profiler
+
+    def apply_action(self, action):
+        """Applies one player input action to the simulation"""
+        if action == 'left_down':
+            self.movement[0] = True
+        elif action == 'left_up':
+            self.movement[0] = False
+        elif action == 'right_down':
+            self.movement[1] = True
+        elif action == 'right_up':
+            self.movement[1] = False
+        elif action == 'jump':
+            if self.player.jump():
+                self.sfx['jump'].play()
+        elif action == 'dash':
+            self.player.dash()
+
+    def update(self):
+        """Advances the simulation by one fixed tick"""
+        profiler = self.profiler
+        """Also polled here for the tools (replay, benchmark) that drive update() without run()"""
+        self.loader.poll()
+        if self.level_pending:
+            self.load_level(self.level)
+
+        profiler.begin('update.input')
+        if self.recorder is not None:
+            self.recorder.tick(self.actions)
+        for action in self.actions:
+            self.apply_action(action)
+        self.actions = []
+        profiler.end('update.input')
+
+        profiler.begin('update.rules')
+        self.screenshake = max(0, self.screenshake - 1)
+
+        """check if there are enemies left"""
+        if not self.enemies and not self.parked_enemies and not self.unspawned_chunks:
+            self.transition += 1
+            if self.transition > 30:
+                self.start_level(min(self.level + 1, len(map_ids()) - 1))
+
+        if self.transition < 0:
+            self.transition += 1
+
+        """check if the player is alive"""
+        if self.dead:
+            self.dead += 1
+            if self.dead >= 10:
+                self.transition = min(30, self.transition + 1)
+            if self.dead > 40:
+                self.lives -= 1
+                if self.lives > 0:
+                    self.start_level(self.level, after_death=True)
+                else:
+                    self.lives = 3
+                    self.start_level(0, after_death=True)
+        profiler.end('update.rules')
+
+        self.last_scroll = list(self.scroll)
+        self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30
+        self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
+        if self.tilemap.streaming:
+            self.stream_world()
+
+        profiler.begin('update.leaves')
+        rng = self.rng.leaves
+        for rect in self.leaf_spawners:
+            if rng.random() * 49999 < rect.width * rect.height:
+                pos = (rect.x + rng.random() * rect.width, rect.y + rng.random() * rect.height)
+                self.particles.add('leaf', pos, velocity=[-0.1, 0.3], frame=rng.randint(0, 20))
+
+        profiler.end('update.leaves')
+
+        profiler.begin('update.clouds')
+        self.clouds.update()
+        profiler.end('update.clouds')
+
+        """Updates each enemy"""
+        profiler.begin('update.enemies')
+        if self.batch_enemies:
+            self.enemy_system.update(self.enemies, self.tilemap)
+        else:
+            for enemy in self.enemies:
+                """Enemies at the edge of the streamed-in area wait until the ground around them is loaded"""
+                if self.tilemap.is_resident(enemy.pos):
+                    enemy.update(self.tilemap, (0, 0))
+        profiler.end('update.enemies')
+
+        """Entity-vs-entity checks query the grid instead of every enemy testing the player on its own"""
+        profiler.begin('update.broadphase')
+        self.entity_grid.track(self.enemies)
+        if abs(self.player.dashing) >= 50:
+            killed = [enemy for enemy in self.entity_grid.in_rect(self.player.rect())
+                      if self.tilemap.is_resident(enemy.pos)]
+            for enemy in killed:
+                enemy.die()
+                self.entity_grid.remove(enemy)
+            if killed:
+                self.enemies = [enemy for enemy in self.enemies if enemy in self.entity_grid]
+        profiler.end('update.broadphase')
+
+        profiler.begin('update.player')
+        if not self.dead:
+            self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
+        profiler.end('update.player')
+
+        """Updates projectiles"""
+        profiler.begin('update.projectiles')
+        rng = self.rng.effects
+        for pos, speed in self.projectiles.update(self.tilemap):
+            for i in range(4):
+                self.sparks.add(pos, rng.random() - 0.5 + (math.pi if speed > 0 else 0), 2 + rng.random())
+        if abs(self.player.dashing) < 50:
+            for pos in self.projectiles.collide_rect(self.player.rect()):
+                self.dead += 1
+                self.sfx['hit'].play()
+                self.screenshake = max(16, self.screenshake)
+                for i in range(30):
+                    angle = rng.random() * math.pi * 2
+                    speed = rng.random() * 5
+                    self.sparks.add(self.player.rect().center, angle, 2 + rng.random())
+                    self.particles.add('particle', self.player.rect().center,
+                                       velocity=[math.cos(angle + math.pi) * speed * 0.5,
+                                                 math.sin(angle + math.pi) * speed * 0.5],
+                                       frame=rng.randint(0, 7))
+        profiler.end('update.projectiles')
+
+        profiler.begin('update.sparks')
+        self.sparks.update()
+        profiler.end('update.sparks')
+
+        profiler.begin('update.particles')
+        self.particles.update()
+        profiler.end('update.particles')
+
+    def render(self, alpha=1):
+        """Draws the current state; alpha blends entity and camera positions between the last two ticks"""
+        profiler = self.profiler
+        self.render_alpha = alpha
+        scroll = self.scroll
+        if alpha < 1:
+            scroll = (self.last_scroll[0] + (self.scroll[0] - self.last_scroll[0]) * alpha,
+                      self.last_scroll[1] + (self.scroll[1] - self.last_scroll[1]) * alpha)
+        render_scroll = (int(scroll[0]), int(scroll[1]))
+
+        profiler.begin('render.background')
+        self.display.fill((0, 0, 0, 0))
+        self.display_2.blit(self.assets['background'], (0, 0))
+
+        self.clouds.render(self.display_2, offset=render_scroll)
+        profiler.end('render.background')
+
+        profiler.begin('render.tilemap')
+        self.tilemap.render(self.display, offset=render_scroll)
+        profiler.end('render.tilemap')
+
+        """Everything drawn between the tilemap and the shadow pass reports the area it touched"""
+        dynamic_rects = []
+
+        profiler.begin('render.enemies')
+        for enemy in self.enemies:
+            dynamic_rects.append(enemy.render(self.display, offset=render_scroll))
+        profiler.end('render.enemies')
+
+        profiler.begin('render.player')
+        if not self.dead:
+            dynamic_rects.append(self.player.render(self.display, offset=render_scroll))
+        profiler.end('render.player')
+
+        profiler.begin('render.projectiles')
+        dynamic_rects += self.projectiles.render(self.display, offset=render_scroll)
+        profiler.end('render.projectiles')
+
+        profiler.begin('render.sparks')
+        dynamic_rects += self.sparks.render(self.display, offset=render_scroll)
+        profiler.end('render.sparks')
+
+        """create shadow effect by rendering silhouette"""
+        profiler.begin('render.shadow')
+        self.shadows.render(self.display, self.display_2, offset=render_scroll, dynamic_rects=dynamic_rects)
+        profiler.end('render.shadow')
+
+        profiler.begin('render.particles')
+        self.particles.render(self.display, offset=render_scroll)
+        profiler.end('render.particles')
+
+        """Transition Effect:"""
+        profiler.begin('render.transition')
+        if self.transition:
+            transition_surf = pygame.Surface(self.display.get_size())
+            pygame.draw.circle(transition_surf, (255, 255, 255),
+                               (self.display.get_width() // 2, self.display.get_height() // 2),
+                               (30 - abs(self.transition)) * 8)
+            transition_surf.set_colorkey((255, 255, 255))
+            self.display.blit(transition_surf, (0, 0))
+        profiler.end('render.transition')
+
+        """Draw the lives text after all game updates but before blitting to self.display_2"""
+        profiler.begin('render.hud')
+        for i in range(self.lives):
+            heart_surface = self.render_cache.text(self.heart_font, self.heart_emoji, (255, 0, 0))  # The heart emoji
+            self.display.blit(heart_surface, (10 + i * (heart_surface.get_width() + 5), 10))
+        profiler.end('render.hud')
+
+        profiler.begin('render.scale')
+        self.display_2.blit(self.display, (0, 0))
+
+        """Final blit operations to self.screen with screenshake effect"""
+        rng = self.rng.screen
+        screenshake_offset = (rng.random() * self.screenshake - self.screenshake / 2,
+                              rng.random() * self.screenshake - self.screenshake / 2)
+        if self.headless:
+            profiler.end('render.scale')
+            return
+        self.presenter.scale(self.display_2, screenshake_offset)
+        profiler.end('render.scale')
+
+        if self.show_profiler:
+            self.profiler.render_overlay(self.screen, self.profiler_font)
+
+        profiler.begin('render.present')
+        self.presenter.present()
+        profiler.end('render.present')
+
+    def start_music(self, future):
+        """Starts the music once the loader has opened it (run by the loader's poll() on the main thread)"""
+        if future.exception() is not None:
+            print(f'music unavailable, playing silence: {future.exception()}', file=sys.stderr)
+            return
+        pygame.mixer.music.set_volume(0.5 if self.menu.music_on else 0)
+        pygame.mixer.music.play(-1)
 
     def run(self):
-        """the main game loop"""
-        pygame.mixer.music.load('data/music.wav')
-        pygame.mixer.music.set_volume(0.5)
-        pygame.mixer.music.play(-1)
-        heart_font = pygame.font.SysFont('segoeuisymbol', 20)
-        heart_emoji = '❤️'
+        """the main game loop: the simulation advances in fixed ticks while frames render as fast as allowed"""
+        if not self.headless:
+            self.loader.when_done(self.loader.submit('music', pygame.mixer.music.load, 'data/music.wav', optional=True),
+                                  self.start_music)
 
         self.sfx['ambience'].play(-1)
 
         self.in_menu = True
 
+        tick_length = 1 / TICK_RATE
+        accumulator = 0
+        previous_time = time.perf_counter()
+
         while True:
+            now = time.perf_counter()
+            """Drop ticks we can't catch up on (slow machine, level load) instead of spiralling"""
+            accumulator = min(accumulator + now - previous_time, MAX_TICKS_PER_FRAME * tick_length)
+            previous_time = now
+            self.loader.poll()
+
             if self.in_menu:
                 self.menu.display()
                 if self.menu.handle_input():
                     self.in_menu = False
-                    self.level = 0
-                    self.run_level_indicator()
+                    if self.record_path:
+                        self.start_recording()
+                    self.start_level(0)
+
+            elif self.overlay:
+                """No ticks run behind an overlay, and the time it showed isn't caught up on afterwards"""
+                self.update_overlay()
+                accumulator = 0
+                previous_time = time.perf_counter()
 
-                    """When not in the menu"""
+                """When not in the menu"""
             else:
-                self.display.fill((0, 0, 0, 0))
-                self.display_2.blit(self.assets['background'], (0, 0))
-                self.screenshake = max(0, self.screenshake - 1)
-
-                """check if there are enemies left"""
-                if not len(self.enemies):
-                    self.transition += 1
-                    if self.transition > 30:
-                        self.level = min(self.level + 1, len(os.listdir('data/maps')) - 1)
-                        self.run_level_indicator()
-
-                if self.transition < 0:
-                    self.transition += 1
-                    
-                    """check if the player is alive"""
-
-                if self.dead:
-                    self.dead += 1
-                    if self.dead >= 10:
-                        self.transition = min(30, self.transition + 1)
-                    if self.dead > 40:
-                        self.show_death_indicator()
-                        self.lives -= 1
-                        if self.lives > 0:
-                            self.load_level(self.level)
-                        else:
-                            self.lives = 3
-                            self.level = 0
-                            self.load_level(self.level)
-
-                self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30
-                self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
-                render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
-
-                for rect in self.leaf_spawners:
-                    if random.random() * 49999 < rect.width * rect.height:
-                        pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)
-                        self.particles.append(
-                            Particle(self, 'leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20)))
-
-                self.clouds.update()
-                self.clouds.render(self.display_2, offset=render_scroll)
-
-                self.tilemap.render(self.display, offset=render_scroll)
-
-                """Updates and renders each enemy"""
-                for enemy in self.enemies.copy():
-                    kill = enemy.update(self.tilemap, (0, 0))
-                    enemy.render(self.display, offset=render_scroll)
-                    if kill:
-                        self.enemies.remove(enemy)
-
-                if not self.dead:
-                    self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
-                    self.player.render(self.display, offset=render_scroll)
-
-                """Updates and renders projectiles"""
-                for projectile in self.projectiles.copy():
-                    projectile[0][0] += projectile[1]
-                    projectile[2] += 1
-                    img = self.assets['projectile']
-                    self.display.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0],
-                                            projectile[0][1] - img.get_height() / 2 - render_scroll[1]))
-                    if self.tilemap.solid_check(projectile[0]):
-                        self.projectiles.remove(projectile)
-                        for i in range(4):
-                            self.sparks.append(
-                                Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0),
-                                      2 + random.random()))
-                    elif projectile[2] > 360:
-                        self.projectiles.remove(projectile)
-                    elif abs(self.player.dashing) < 50:
-                        if self.player.rect().collidepoint(projectile[0]):
-                            self.projectiles.remove(projectile)
-                            self.dead += 1
-                            self.sfx['hit'].play()
-                            self.screenshake = max(16, self.screenshake)
-                            for i in range(30):
-                                angle = random.random() * math.pi * 2
-                                speed = random.random() * 5
-                                self.sparks.append(Spark(self.player.rect().center, angle, 2 + random.random()))
-                                self.particles.append(Particle(self, 'particle', self.player.rect().center,
-                                                               velocity=[math.cos(angle + math.pi) * speed * 0.5,
-                                                                         math.sin(angle + math.pi) * speed * 0.5],
-                                                               frame=random.randint(0, 7)))
-
-                for spark in self.sparks.copy():
-                    kill = spark.update()
-                    spark.render(self.display, offset=render_scroll)
-                    if kill:
-                        self.sparks.remove(spark)
-
-                """create shadow effect by rendering silhouette"""
-                display_mask = pygame.mask.from_surface(self.display)
-                display_sillhouette = display_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
-                for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    self.display_2.blit(display_sillhouette, offset)
-
-                for particle in self.particles.copy():
-                    kill = particle.update()
-                    particle.render(self.display, offset=render_scroll)
-                    if particle.type == 'leaf':
-                        particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.3
-                    if kill:
-                        self.particles.remove(particle)
-
-                """Handles various events like quitting or key presses/releases for player movement and actions"""
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        sys.exit()
-                    if event.type == pygame.KEYDOWN:
-                        if event.key == pygame.K_LEFT:
-                            self.movement[0] = True
-                        if event.key == pygame.K_RIGHT:
-                            self.movement[1] = True
-                        if event.key == pygame.K_UP:
-                            if self.player.jump():
-                                self.sfx['jump'].play()
-                        if event.key == pygame.K_x:
-                            self.player.dash()
-                    if event.type == pygame.KEYUP:
-                        if event.key == pygame.K_LEFT:
-                            self.movement[0] = False
-                        if event.key == pygame.K_RIGHT:
-                            self.movement[1] = False
-
-                """Transition Effect:"""
-                if self.transition:
-                    transition_surf = pygame.Surface(self.display.get_size())
-                    pygame.draw.circle(transition_surf, (255, 255, 255),
-                                       (self.display.get_width() // 2, self.display.get_height() // 2),
-                                       (30 - abs(self.transition)) * 8)
-                    transition_surf.set_colorkey((255, 255, 255))
-                    self.display.blit(transition_surf, (0, 0))
-
-                """Draw the lives text after all game updates but before blitting to self.display_2"""
-                for i in range(self.lives):
-                    heart_surface = heart_font.render(heart_emoji, True, (255, 0, 0))  # Render the heart emoji
-                    self.display.blit(heart_surface, (10 + i * (heart_surface.get_width() + 5), 10))
-
-                self.display_2.blit(self.display, (0, 0))
-
-                """Final blit operations to self.screen with screenshake effect"""
-                screenshake_offset = (random.random() * self.screenshake - self.screenshake / 2,
-                                      random.random() * self.screenshake - self.screenshake / 2)
-                self.screen.blit(pygame.transform.scale(self.display_2, self.screen.get_size()), screenshake_offset)
-
-                pygame.display.update()
-                self.clock.tick(60)
-
-
-Game().run()
+                self.profiler.frame_start()
+                self.handle_events()
+
+                while accumulator >= tick_length and not self.overlay:
+                    self.update()
+                    accumulator -= tick_length
+
+                self.render(accumulator / tick_length if self.interpolate else 1)
+                self.profiler.frame_end()
+
+            self.clock.tick(MENU_FPS if self.in_menu else MAX_FPS)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Enemy Eclipse')
+    parser.add_argument('--record', metavar='FILE', help='record the input of the session to FILE (see replay.py)')
+    args = parser.parse_args()
+    Game(record=args.record).run()
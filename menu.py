@@ -1,5 +1,6 @@
 import pygame
-import os
+
+from scripts.assets import get_registry
 
 
 class Menu:
@@ -9,32 +10,32 @@ class Menu:
         self.screen = screen
         self.menu_font_large = pygame.font.Font(None, 48)
         self.music_on = True
+        """The music_on state last drawn on the screen, None when the whole menu must be redrawn"""
+        self.drawn = None
+
+        assets = get_registry()
 
         """Load background image """
-        background_path = os.path.join('data', 'images', 'background.png')
-        self.background = pygame.image.load(background_path)
+        self.background = assets.image('background.png', colorkey=None)
         self.background = pygame.transform.scale(self.background, self.screen.get_size())
 
         """Load start icon"""
-        icon_path = os.path.join('data', 'images', 'start.png')
-        self.icon = pygame.image.load(icon_path).convert_alpha()
         white = (255, 255, 255)
-        self.icon.set_colorkey(white)
+        self.icon = assets.image('start.png', alpha=True, colorkey=white)
         self.icon_rect = self.icon.get_rect(center=(self.screen.get_width() // 2, self.screen.get_height() // 2 + 50))
 
         """Load the music icon"""
-        self.music_icon = self.load_and_make_circular('data/images/music.png')
-        self.mute_icon = self.load_and_make_circular('data/images/mute.png')
+        self.music_icon = self.load_and_make_circular('music.png')
+        self.mute_icon = self.load_and_make_circular('mute.png')
         self.music_icon_rect = self.music_icon.get_rect(midtop=(self.icon_rect.centerx, self.icon_rect.bottom + 10))
 
-        logo_path = os.path.join('data', 'images', 'logo.png')  # Replace with your logo file path
-        self.logo = self.load_and_make_circular(logo_path)
+        self.logo = self.load_and_make_circular('logo.png')  # Replace with your logo file path
         self.logo_rect = self.logo.get_rect(center=(self.screen.get_width() // 2, self.screen.get_height() // 2 - 50))
 
     @staticmethod
     def load_and_make_circular(image_path):
-        """Load the image"""
-        image = pygame.image.load(image_path).convert_alpha()
+        """Load the image (a path relative to data/images)"""
+        image = get_registry().image(image_path, alpha=True, colorkey=None)
 
         """Create a circular mask"""
         mask = pygame.Surface(image.get_size(), pygame.SRCALPHA)
@@ -46,11 +47,21 @@ class Menu:
         return mask
 
     def display(self):
-        self.screen.blit(self.background, (0, 0))
-
-        self.screen.blit(self.logo, self.logo_rect.topleft)
-
-        self.screen.blit(self.icon, self.icon_rect.topleft)
+        """Draws and presents the menu, but only the parts that changed since the last call"""
+        presenter = self.game.presenter
+        if self.drawn is None:
+            self.screen.blit(self.background, (0, 0))
+
+            self.screen.blit(self.logo, self.logo_rect.topleft)
+
+            self.screen.blit(self.icon, self.icon_rect.topleft)
+            presenter.damage()
+        elif self.drawn != self.music_on:
+            self.screen.blit(self.background, self.music_icon_rect, self.music_icon_rect)
+            presenter.damage(self.music_icon_rect)
+        else:
+            return
+        self.drawn = self.music_on
 
         """Display the icon"""
         if self.music_on:
@@ -58,7 +69,7 @@ class Menu:
         else:
             self.screen.blit(self.mute_icon, self.music_icon_rect)
 
-        pygame.display.flip()
+        presenter.present()
 
     def toggle_sounds(self):
         self.music_on = not self.music_on
@@ -76,6 +87,8 @@ class Menu:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 quit()
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                self.drawn = None
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = pygame.mouse.get_pos()
                 if self.icon_rect.collidepoint(mouse_pos):
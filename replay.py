@@ -0,0 +1,105 @@
+"""Re-runs a session recorded with 'python game.py --record FILE' and reports how long each tick took.
+
+usage: python replay.py [--render] [--window] [--realtime] [--batch-enemies] [--json] FILE
+
+The game is seeded and fed the recorded input tick by tick, so every run of a log simulates exactly the same
+session: compare frame times before and after a change, or reproduce a stutter from a player's recording.
+By default ticks run headless and as fast as possible without rendering; --render also draws every tick,
+--window presents the frames in a window and --realtime paces the ticks at the game's tick rate.
+"""
+import os
+import argparse
+import json
+import time
+
+"""The banner pygame prints on import would end up in the --json output"""
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+
+from game import Game, TICK_RATE
+from scripts.inputlog import InputLog
+
+SLOWEST_TICKS = 5
+
+
+def finish_overlays(game):
+    """Ends the loading/death overlays of a windowed game right away, loading the level they wait for."""
+    while game.overlay:
+        game.finish_overlay()
+
+
+def replay(game, log, render=False, realtime=False):
+    """Re-runs a recorded session on the game. Returns the measurements and the final state as a dict."""
+    game.in_menu = False
+    game.seed(log.seed)
+    game.lives = log.lives
+    game.start_level(log.level)
+    finish_overlays(game)
+
+    tick_times = []
+    start = time.perf_counter()
+    for actions in log.inputs():
+        tick_start = time.perf_counter()
+        game.actions.extend(actions)
+        game.update()
+        finish_overlays(game)
+        if render:
+            game.render()
+        if not game.headless:
+            pygame.event.pump()
+        tick_times.append(time.perf_counter() - tick_start)
+        if realtime:
+            game.clock.tick(TICK_RATE)
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(tick_times)
+    slowest = sorted(range(len(tick_times)), key=lambda tick: -tick_times[tick])[:SLOWEST_TICKS]
+    return {
+        'ticks': log.ticks,
+        'seconds': elapsed,
+        'ticks_per_second': log.ticks / elapsed if elapsed else float('inf'),
+        'tick_ms_mean': sum(tick_times) / len(tick_times) * 1000 if tick_times else 0,
+        'tick_ms_p50': ordered[len(ordered) // 2] * 1000 if ordered else 0,
+        'tick_ms_p99': ordered[len(ordered) * 99 // 100] * 1000 if ordered else 0,
+        'tick_ms_max': ordered[-1] * 1000 if ordered else 0,
+        'slowest_ticks': [[tick, tick_times[tick] * 1000] for tick in slowest],
+        'final_level': game.level,
+        'lives': game.lives,
+        'player_pos': list(game.player.pos),
+        'enemies_left': len(game.enemies),
+    }
+
+
+def print_report(result):
+    print(f"{result['ticks']} ticks in {result['seconds']:.3f}s ({result['ticks_per_second']:.0f} ticks/s): "
+          f"mean {result['tick_ms_mean']:.2f} ms, p50 {result['tick_ms_p50']:.2f} ms, "
+          f"p99 {result['tick_ms_p99']:.2f} ms, max {result['tick_ms_max']:.2f} ms")
+    print('slowest ticks: ' + ', '.join(f'{tick} ({ms:.2f} ms)' for tick, ms in result['slowest_ticks']))
+    print(f"final state: level {result['final_level']}, {result['lives']} lives, player at "
+          f"({result['player_pos'][0]:.2f}, {result['player_pos'][1]:.2f}), {result['enemies_left']} enemies left")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', help='input log written by game.py --record')
+    parser.add_argument('--render', action='store_true', help='render every tick')
+    parser.add_argument('--window', action='store_true', help='show the rendered ticks in a window (implies --render)')
+    parser.add_argument('--realtime', action='store_true', help='run at the tick rate instead of as fast as possible')
+    parser.add_argument('--batch-enemies', action='store_true',
+                        help='update enemies with the batch EnemySystem instead of one Enemy.update call each')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    log = InputLog.load(args.log)
+    game = Game(headless=not args.window)
+    game.batch_enemies = args.batch_enemies
+    result = replay(game, log, render=args.render or args.window, realtime=args.realtime)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Process-wide image registry backed by a packed texture atlas.
+
+The build step ('python -m scripts.assets') decodes every PNG under data/images once, packs them into a
+single atlas and writes it to data/cache as raw RGBA pixels plus a JSON index. At runtime the pixel file is
+memory-mapped and converted in one go, and every image is handed out as a subsurface of the atlas. When the
+cache is missing or older than the source images, the registry falls back to decoding the PNGs and rebuilds
+the cache for the next start.
+"""
+import os
+import sys
+import json
+import mmap
+
+import pygame
+
+BASE_IMG_PATH = 'data/images/'
+CACHE_PATH = 'data/cache/'
+MAX_ATLAS_WIDTH = 1024
+ATLAS_PADDING = 1
+ATLAS_VERSION = 1
+
+_registry = None
+
+
+def get_registry():
+    """Returns the registry shared by the game, the menu and the editor."""
+    global _registry
+    if _registry is None:
+        _registry = AssetRegistry()
+    return _registry
+
+
+def source_files(base_path=BASE_IMG_PATH, prefix=''):
+    """Returns {relative path: [mtime_ns, size]} for every PNG under base_path."""
+    sources = {}
+    with os.scandir(base_path + prefix) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.is_dir():
+                sources.update(source_files(base_path, prefix + entry.name + '/'))
+            elif entry.name.lower().endswith('.png'):
+                stat = entry.stat()
+                sources[prefix + entry.name] = [stat.st_mtime_ns, stat.st_size]
+    return sources
+
+
+def pack(sizes, width, padding=ATLAS_PADDING):
+    """Shelf-packs {name: (w, h)} into rows of the given width; returns ({name: [x, y, w, h]}, height)."""
+    rects = {}
+    x = y = shelf_height = 0
+    for name in sorted(sizes, key=lambda name: (-sizes[name][1], name)):
+        w, h = sizes[name]
+        if x + w > width:
+            x = 0
+            y += shelf_height + padding
+            shelf_height = 0
+        rects[name] = [x, y, w, h]
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+    return rects, y + shelf_height
+
+
+def pack_atlas(base_path=BASE_IMG_PATH):
+    """Decodes every source image and packs them; returns (RGBA pixel bytes, index)."""
+    sources = source_files(base_path)
+    images = {name: pygame.image.load(base_path + name) for name in sources}
+    sizes = {name: img.get_size() for name, img in images.items()}
+
+    """Pick the shelf width that wastes the least area, since the whole atlas is converted at load time"""
+    widest = max([1] + [w for w, h in sizes.values()])
+    layouts = [pack(sizes, width) + (width,) for width in range(widest, max(widest, MAX_ATLAS_WIDTH) + 1, 16)]
+    rects, height, width = min(layouts, key=lambda layout: layout[1] * layout[2])
+    height = max(1, height)
+
+    pixels = bytearray(width * height * 4)
+    stride = width * 4
+    for name, img in images.items():
+        x, y, w, h = rects[name]
+        data = pygame.image.tobytes(img, 'RGBA')
+        for row in range(h):
+            start = (y + row) * stride + x * 4
+            pixels[start:start + w * 4] = data[row * w * 4:(row + 1) * w * 4]
+    return pixels, {'version': ATLAS_VERSION, 'size': [width, height], 'sources': sources, 'rects': rects}
+
+
+def build(base_path=BASE_IMG_PATH, cache_path=CACHE_PATH):
+    """Packs the source images and writes atlas.rgba and atlas.json to cache_path; returns (pixels, index)."""
+    pixels, index = pack_atlas(base_path)
+    os.makedirs(cache_path, exist_ok=True)
+    with open(cache_path + 'atlas.rgba', 'wb') as f:
+        f.write(pixels)
+    with open(cache_path + 'atlas.json', 'w') as f:
+        json.dump(index, f)
+    return pixels, index
+
+
+class AssetRegistry:
+    """Loads the atlas on first use and hands out cached, converted subsurfaces of it.
+
+    image() mirrors the old utils.load_image: the image is converted to the display format with black as
+    the colorkey. Pass alpha=True for convert_alpha() and colorkey=None for no colorkey. Returned surfaces
+    are shared, so callers that want to modify one should copy it first.
+    """
+
+    def __init__(self, base_path=BASE_IMG_PATH, cache_path=CACHE_PATH):
+        self.base_path = base_path
+        self.cache_path = cache_path
+        self.rects = None
+        self.pixels = None
+        self.atlas = None
+        self.converted = {}
+        self.images = {}
+
+    def load(self):
+        """Maps the cached atlas, or rebuilds it when missing or stale."""
+        pixels = None
+        try:
+            with open(self.cache_path + 'atlas.json') as f:
+                index = json.load(f)
+            if index.get('version') == ATLAS_VERSION and index['sources'] == source_files(self.base_path):
+                with open(self.cache_path + 'atlas.rgba', 'rb') as f:
+                    pixels = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, KeyError):
+            pixels = None
+        if pixels is None:
+            try:
+                pixels, index = build(self.base_path, self.cache_path)
+            except OSError:
+                """Read-only install: use the atlas packed in memory"""
+                pixels, index = pack_atlas(self.base_path)
+        self.pixels = pixels
+        self.atlas = pygame.image.frombuffer(pixels, index['size'], 'RGBA')
+        self.rects = index['rects']
+
+    def atlas_surface(self, alpha):
+        if self.atlas is None:
+            self.load()
+        if alpha not in self.converted:
+            self.converted[alpha] = self.atlas.convert_alpha() if alpha else self.atlas.convert()
+        return self.converted[alpha]
+
+    def image(self, path, alpha=False, colorkey=(0, 0, 0)):
+        """Returns the image at data/images/<path>."""
+        key = (path, alpha, colorkey)
+        if key not in self.images:
+            atlas = self.atlas_surface(alpha)
+            img = atlas.subsurface(self.rects[path])
+            if colorkey is not None:
+                img.set_colorkey(colorkey)
+            self.images[key] = img
+        return self.images[key]
+
+    def image_names(self, path):
+        """Returns the sorted paths of the images directly inside data/images/<path>."""
+        if self.atlas is None:
+            self.load()
+        prefix = path.rstrip('/') + '/'
+        return sorted(name for name in self.rects if name.startswith(prefix) and '/' not in name[len(prefix):])
+
+    def images_in(self, path, alpha=False, colorkey=(0, 0, 0)):
+        """Returns every image of a directory, sorted by file name."""
+        return [self.image(name, alpha, colorkey) for name in self.image_names(path)]
+
+
+if __name__ == '__main__':
+    pygame.init()
+    pixels, index = build()
+    print(f'packed {len(index["rects"])} images into a {index["size"][0]}x{index["size"][1]} atlas '
+          f'({len(pixels) // 1024} KiB) in {CACHE_PATH}', file=sys.stderr)
@@ -1,36 +1,28 @@
 import random
 
+from scripts.parallax import ParallaxLayer, ParallaxBackground
 
-class Cloud:
-    def __init__(self, pos, img, speed, depth):
-        self.pos = list(pos)
-        self.img = img
-        self.speed = speed
-        self.depth = depth
+CLOUD_BANDS = 4
+VIEW_SIZE = (320, 240)
 
-    def update(self):
-        self.pos[0] += self.speed
 
-    def render(self, surf, offset=(0, 0)):
-        render_pos = (self.pos[0] - offset[0] * self.depth, self.pos[1] - offset[1] * self.depth)
-        surf.blit(self.img, (render_pos[0] % (surf.get_width() + self.img.get_width()) - self.img.get_width(),
-                             render_pos[1] % (surf.get_height() + self.img.get_height()) - self.img.get_height()))
+class Clouds(ParallaxBackground):
+    """The sky: 'count' clouds spread over CLOUD_BANDS depth bands.
 
+    Clouds in a band share its depth and drift speed, the nearer bands following the camera and drifting
+    more, so each band is a single ParallaxLayer and the sky costs at most two blits per band whatever
+    the number of clouds. A cloud reappears once it has left the view by its own size, as before.
+    """
 
-class Clouds:
-    def __init__(self, cloud_images, count=16):
-        self.clouds = []
+    def __init__(self, cloud_images, count=16, rng=random, bands=CLOUD_BANDS, view_size=VIEW_SIZE):
+        period = (view_size[0] + max(img.get_width() for img in cloud_images),
+                  view_size[1] + max(img.get_height() for img in cloud_images))
+        layers = []
+        for i in range(bands):
+            near = (i + 0.5) / bands
+            layers.append(ParallaxLayer(period, depth=0.2 + 0.6 * near, speed=0.05 + 0.05 * near))
+        super().__init__(layers)
 
         for i in range(count):
-            self.clouds.append(Cloud((random.random() * 99999, random.random() * 99999), random.choice(cloud_images),
-                                     random.random() * 0.05 + 0.05, random.random() * 0.6 + 0.2))
-
-        self.clouds.sort(key=lambda x: x.depth)
-
-    def update(self):
-        for cloud in self.clouds:
-            cloud.update()
-
-    def render(self, surf, offset=(0, 0)):
-        for cloud in self.clouds:
-            cloud.render(surf, offset=offset)
+            pos = (rng.random() * period[0], rng.random() * period[1])
+            self.layers[min(bands - 1, int(rng.random() * bands))].add(rng.choice(cloud_images), pos)
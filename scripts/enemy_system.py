@@ -0,0 +1,142 @@
+"""Designed to advance every enemy as one batch over parallel lists"""
+import math
+
+from scripts.entities import sweep, ground_ahead, clear_shot
+
+
+class EnemySystem:
+    """Data-oriented replacement for calling Enemy.update on every enemy.
+
+    Positions, vertical velocities, walk timers, flip flags and wall contacts live in parallel lists that
+    update() advances in three passes: walk and fire decisions, then gravity, movement and tile collisions,
+    then animation. Each pass runs the rules of Enemy.update / PhysicsEntity.step in the same enemy order
+    and with the same random calls, so a game produces the same results with either; the ledge, fire and
+    collision tests are the helpers of scripts.entities that the Enemy objects use too.
+
+    The Enemy objects stay the game's handles for rendering, parking and dash kills. The lists are
+    gathered from them whenever the enemy list changes, and positions, flags and animations are written
+    back after every update.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.enemies = []
+        self.width = []
+        self.height = []
+        self.x = []
+        self.y = []
+        self.vy = []
+        self.walking = []
+        self.flip = []
+        self.blocked = []
+
+    def __len__(self):
+        return len(self.enemies)
+
+    def gather(self, enemies):
+        """Copies the state of the given Enemy objects into the lists."""
+        self.enemies = list(enemies)
+        self.width = [enemy.size[0] for enemy in enemies]
+        self.height = [enemy.size[1] for enemy in enemies]
+        self.x = [enemy.pos[0] for enemy in enemies]
+        self.y = [enemy.pos[1] for enemy in enemies]
+        self.vy = [enemy.velocity[1] for enemy in enemies]
+        self.walking = [enemy.walking for enemy in enemies]
+        self.flip = [enemy.flip for enemy in enemies]
+        self.blocked = [enemy.collisions['right'] or enemy.collisions['left'] for enemy in enemies]
+
+    def update(self, enemies, tilemap):
+        """Advances the given enemies by one tick; enemies outside the streamed-in area wait, as before."""
+        if enemies != self.enemies:
+            self.gather(enemies)
+        if tilemap.streaming:
+            active = [i for i, enemy in enumerate(self.enemies) if tilemap.is_resident(enemy.pos)]
+        else:
+            active = range(len(self.enemies))
+        moves = self.think(active, tilemap)
+        floors = self.move(active, moves, tilemap)
+        self.write_back(active, moves, floors)
+
+    def think(self, active, tilemap):
+        """Runs the walk timers, ledge checks and fire decisions; returns each enemy's horizontal movement."""
+        game = self.game
+        x, y, walking, flip, blocked = self.x, self.y, self.walking, self.flip, self.blocked
+        widths, heights = self.width, self.height
+        player = game.player
+        rng = game.rng.enemies
+        effects = game.rng.effects
+        moves = {}
+        for i in active:
+            if walking[i]:
+                if ground_ahead(tilemap, x[i], y[i], widths[i], flip[i]):
+                    if blocked[i]:
+                        flip[i] = not flip[i]
+                    else:
+                        moves[i] = -0.5 if flip[i] else 0.5
+                else:
+                    flip[i] = not flip[i]
+                walking[i] -= 1
+                if not walking[i] and abs(player.pos[1] - y[i]) < 16:
+                    direction = -1 if flip[i] else 1
+                    pos = (int(x[i]) + widths[i] // 2 + 7 * direction, int(y[i]) + heights[i] // 2)
+                    if clear_shot(tilemap, x[i], pos, direction, player):
+                        game.sfx['shoot'].play()
+                        game.projectiles.add(pos, 1.5 * direction)
+                        for j in range(4):
+                            game.sparks.add(pos, effects.random() - 0.5 + (math.pi if flip[i] else 0),
+                                            2 + effects.random())
+            elif rng.random() < 0.01:
+                walking[i] = rng.randint(30, 120)
+        return moves
+
+    def move(self, active, moves, tilemap):
+        """Applies movement and gravity, colliding with sweep() like PhysicsEntity.move.
+
+        Updates the wall contacts and returns {enemy index: 'down' or 'up'} for the enemies that hit a floor
+        or a ceiling.
+        """
+        x, y, vy, flip, blocked = self.x, self.y, self.vy, self.flip, self.blocked
+        widths, heights = self.width, self.height
+        floors = {}
+        for i in active:
+            dx = moves.get(i, 0)
+            dy = vy[i]
+            x[i], y[i], wall, floor = sweep(tilemap, x[i], y[i], widths[i], heights[i], dx, dy)
+            if floor:
+                floors[i] = floor
+            if dx > 0:
+                flip[i] = False
+            if dx < 0:
+                flip[i] = True
+            blocked[i] = wall is not None
+            vy[i] = 0 if floor else min(5, dy + 0.1)
+        return floors
+
+    def write_back(self, active, moves, floors):
+        """Copies the new state to the Enemy objects and advances their animations."""
+        enemies, x, y, vy, walking, flip, blocked = \
+            self.enemies, self.x, self.y, self.vy, self.walking, self.flip, self.blocked
+        for i in active:
+            enemy = enemies[i]
+            pos = enemy.pos
+            enemy.last_pos[0] = pos[0]
+            enemy.last_pos[1] = pos[1]
+            pos[0] = x[i]
+            pos[1] = y[i]
+            enemy.velocity[1] = vy[i]
+            enemy.walking = walking[i]
+            enemy.flip = flip[i]
+            move_x = moves.get(i, 0)
+            collisions = enemy.collisions
+            collisions['up'] = collisions['down'] = collisions['right'] = collisions['left'] = False
+            if blocked[i]:
+                collisions['right' if move_x > 0 else 'left'] = True
+            if i in floors:
+                collisions[floors[i]] = True
+            enemy.last_movement[0] = move_x
+            enemy.last_movement[1] = 0
+            action = 'run' if i in moves else 'idle'
+            if action != enemy.action:
+                enemy.set_action(action)
+            else:
+                enemy.animation.update()
@@ -1,22 +1,118 @@
 import math
-import random
 
 import pygame
 
-from scripts.particle import Particle
-from scripts.spark import Spark
+from scripts.tilemap import NEIGHBOR_OFFSETS
+
+_overlapped = {}
+
+
+def overlapped(column_left, column_right, row_top, row_bottom, after=-1):
+    """Returns the (index, offset_x, offset_y) of the NEIGHBOR_OFFSETS entries after 'after' that lie in the
+    given column and row ranges, relative to the tile of an entity's top-left corner.
+
+    These are the neighbours an entity overlaps, in the order sweep() tests them; the lists are cached since
+    an entity smaller than a tile only produces a handful of different ranges.
+    """
+    key = (column_left, column_right, row_top, row_bottom, after)
+    candidates = _overlapped.get(key)
+    if candidates is None:
+        candidates = _overlapped[key] = tuple(
+            (index, offset_x, offset_y) for index, (offset_x, offset_y) in enumerate(NEIGHBOR_OFFSETS)
+            if index > after and column_left <= offset_x <= column_right and row_top <= offset_y <= row_bottom)
+    return candidates
+
+
+def sweep(tilemap, x, y, width, height, dx, dy):
+    """Moves a width x height box at (x, y) by dx, then by dy, pushing it out of the solid tiles it ends up
+    overlapping. Returns (x, y, wall, floor) where wall is 'right' or 'left' if it hit a wall and floor 'down'
+    or 'up' if it hit a floor or a ceiling, None otherwise.
+
+    Works on tile coordinates and tilemap.solid_at() instead of Rects, and only asks the tilemap about tiles
+    the box overlaps. Edges are truncated like pygame.Rect and the tiles around the top-left corner are tested
+    in NEIGHBOR_OFFSETS order, as physics_rects_around did. A tick moves less than a tile, so those tiles
+    cover the whole sweep. Both PhysicsEntity.move and EnemySystem.move collide through this.
+    """
+    size = tilemap.tile_size
+    wall = floor = None
+
+    x += dx
+    left = int(x)
+    top = int(y)
+    tile_x = int(x // size)
+    tile_y = int(y // size)
+    candidates = overlapped(left // size - tile_x, (left + width - 1) // size - tile_x,
+                            top // size - tile_y, (top + height - 1) // size - tile_y)
+    i = 0
+    while i < len(candidates):
+        index, offset_x, offset_y = candidates[i]
+        i += 1
+        if tilemap.solid_at(tile_x + offset_x, tile_y + offset_y):
+            if dx > 0:
+                left = (tile_x + offset_x) * size - width
+                wall = 'right'
+            if dx < 0:
+                left = (tile_x + offset_x + 1) * size
+                wall = 'left'
+            x = left
+            """The box moved: only the later neighbours it still overlaps are left to test"""
+            candidates = overlapped(left // size - tile_x, (left + width - 1) // size - tile_x,
+                                    top // size - tile_y, (top + height - 1) // size - tile_y, index)
+            i = 0
+
+    y += dy
+    left = int(x)
+    top = int(y)
+    tile_x = int(x // size)
+    tile_y = int(y // size)
+    candidates = overlapped(left // size - tile_x, (left + width - 1) // size - tile_x,
+                            top // size - tile_y, (top + height - 1) // size - tile_y)
+    i = 0
+    while i < len(candidates):
+        index, offset_x, offset_y = candidates[i]
+        i += 1
+        if tilemap.solid_at(tile_x + offset_x, tile_y + offset_y):
+            if dy > 0:
+                top = (tile_y + offset_y) * size - height
+                floor = 'down'
+            if dy < 0:
+                top = (tile_y + offset_y + 1) * size
+                floor = 'up'
+            y = top
+            candidates = overlapped(left // size - tile_x, (left + width - 1) // size - tile_x,
+                                    top // size - tile_y, (top + height - 1) // size - tile_y, index)
+            i = 0
+    return x, y, wall, floor
+
+
+def ground_ahead(tilemap, x, y, width, flip):
+    """Whether a walking enemy at (x, y) has ground a step ahead of it, checked below its gun."""
+    ahead = int(x) + width // 2 + (-7 if flip else 7)
+    return tilemap.solid_at(int(ahead // tilemap.tile_size), int((y + 23) // tilemap.tile_size))
+
+
+def clear_shot(tilemap, x, gun_pos, direction, player):
+    """Whether an enemy at x, its gun at gun_pos and facing 'direction', has the player in front of it with no
+    wall in the way. Shots travel along the row of the gun.
+    """
+    return (player.pos[0] - x) * direction > 0 and \
+        tilemap.line_of_sight(gun_pos, (player.rect().centerx, gun_pos[1]))
 
 
 class PhysicsEntity:
     """A base class for game entities that have physics-based interactions."""
+    __slots__ = ('game', 'type', 'pos', 'last_pos', 'size', 'velocity', 'collisions', 'action', 'animation',
+                 'anim_offset', 'flip', 'last_movement', 'hitbox')
 
     def __init__(self, game, e_type, pos, size):
         self.game = game
         self.type = e_type
         self.pos = list(pos)
+        self.last_pos = list(pos)
         self.size = size
         self.velocity = [0, 0]
         self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
+        self.hitbox = pygame.Rect(0, 0, size[0], size[1])
 
         self.action = ''
         self.anim_offset = (-3, -3)
@@ -26,7 +122,19 @@ class PhysicsEntity:
         self.last_movement = [0, 0]
 
     def rect(self):
-        return pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
+        """Returns the entity's hitbox. The same Rect is reused by every call, so copy it to keep it"""
+        hitbox = self.hitbox
+        hitbox.x = int(self.pos[0])
+        hitbox.y = int(self.pos[1])
+        return hitbox
+
+    def render_pos(self):
+        """Returns the position to draw at, interpolated between the last two ticks when the game asks for it"""
+        alpha = self.game.render_alpha
+        if alpha >= 1:
+            return self.pos
+        return (self.last_pos[0] + (self.pos[0] - self.last_pos[0]) * alpha,
+                self.last_pos[1] + (self.pos[1] - self.last_pos[1]) * alpha)
 
     def set_action(self, action):
         if action != self.action:
@@ -35,54 +143,51 @@ class PhysicsEntity:
 
     def update(self, tilemap, movement=(0, 0)):
         """Handles the entity's movement and collision detection with a tilemap"""
-        self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
+        self.step(tilemap, movement[0], movement[1])
+
+    def step(self, tilemap, move_x, move_y):
+        """update() with the movement as two numbers; reuses the entity's state so a tick allocates nothing"""
+        collisions = self.collisions
+        collisions['up'] = collisions['down'] = collisions['right'] = collisions['left'] = False
+        self.last_pos[0] = self.pos[0]
+        self.last_pos[1] = self.pos[1]
 
-        frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
-
-        self.pos[0] += frame_movement[0]
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                if frame_movement[0] > 0:
-                    entity_rect.right = rect.left
-                    self.collisions['right'] = True
-                if frame_movement[0] < 0:
-                    entity_rect.left = rect.right
-                    self.collisions['left'] = True
-                self.pos[0] = entity_rect.x
-
-        self.pos[1] += frame_movement[1]
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                if frame_movement[1] > 0:
-                    entity_rect.bottom = rect.top
-                    self.collisions['down'] = True
-                if frame_movement[1] < 0:
-                    entity_rect.top = rect.bottom
-                    self.collisions['up'] = True
-                self.pos[1] = entity_rect.y
-
-        if movement[0] > 0:
+        self.move(tilemap, move_x + self.velocity[0], move_y + self.velocity[1])
+
+        if move_x > 0:
             self.flip = False
-        if movement[0] < 0:
+        if move_x < 0:
             self.flip = True
 
-        self.last_movement = movement
+        self.last_movement[0] = move_x
+        self.last_movement[1] = move_y
 
         self.velocity[1] = min(5, self.velocity[1] + 0.1)
 
-        if self.collisions['down'] or self.collisions['up']:
+        if collisions['down'] or collisions['up']:
             self.velocity[1] = 0
 
         self.animation.update()
 
+    def move(self, tilemap, dx, dy):
+        """Moves one axis at a time and pushes the entity out of the solid tiles it ends up overlapping."""
+        pos = self.pos
+        pos[0], pos[1], wall, floor = sweep(tilemap, pos[0], pos[1], self.size[0], self.size[1], dx, dy)
+        if wall:
+            self.collisions[wall] = True
+        if floor:
+            self.collisions[floor] = True
+
     def render(self, surf, offset=(0, 0)):
-        surf.blit(pygame.transform.flip(self.animation.img(), self.flip, False),
-                  (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[1]))
+        """Returns the area drawn on"""
+        pos = self.render_pos()
+        return surf.blit(self.game.render_cache.flipped(self.animation.img(), self.flip),
+                         (pos[0] - offset[0] + self.anim_offset[0], pos[1] - offset[1] + self.anim_offset[1]))
 
 
 class Enemy(PhysicsEntity):
+    __slots__ = ('walking',)
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'enemy', pos, size)
 
@@ -90,69 +195,72 @@ class Enemy(PhysicsEntity):
 
     def update(self, tilemap, movement=(0, 0)):
         """Implements enemy-specific behaviors"""
+        move_x, move_y = movement
         if self.walking:
-            if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
+            if ground_ahead(tilemap, self.pos[0], self.pos[1], self.size[0], self.flip):
                 if self.collisions['right'] or self.collisions['left']:
                     self.flip = not self.flip
                 else:
-                    movement = (movement[0] - 0.5 if self.flip else 0.5, movement[1])
+                    move_x = move_x - 0.5 if self.flip else 0.5
             else:
                 self.flip = not self.flip
             self.walking = max(0, self.walking - 1)
-            if not self.walking:
-                dis = (self.game.player.pos[0] - self.pos[0], self.game.player.pos[1] - self.pos[1])
-                if abs(dis[1]) < 16:
-                    if self.flip and dis[0] < 0:
-                        self.game.sfx['shoot'].play()
-                        self.game.projectiles.append([[self.rect().centerx - 7, self.rect().centery], -1.5, 0])
-                        for i in range(4):
-                            self.game.sparks.append(Spark(self.game.projectiles[-1][0], random.random() - 0.5 + math.pi,
-                                                          2 + random.random()))
-                    if not self.flip and dis[0] > 0:
-                        self.game.sfx['shoot'].play()
-                        self.game.projectiles.append([[self.rect().centerx + 7, self.rect().centery], 1.5, 0])
-                        for i in range(4):
-                            self.game.sparks.append(
-                                Spark(self.game.projectiles[-1][0], random.random() - 0.5, 2 + random.random()))
-        elif random.random() < 0.01:
-            self.walking = random.randint(30, 120)
-
-        super().update(tilemap, movement=movement)
-
-        if movement[0] != 0:
+            if not self.walking and abs(self.game.player.pos[1] - self.pos[1]) < 16:
+                direction = -1 if self.flip else 1
+                pos = (self.rect().centerx + 7 * direction, self.rect().centery)
+                if clear_shot(tilemap, self.pos[0], pos, direction, self.game.player):
+                    self.game.sfx['shoot'].play()
+                    self.game.projectiles.add(pos, 1.5 * direction)
+                    rng = self.game.rng.effects
+                    for i in range(4):
+                        self.game.sparks.add(pos, rng.random() - 0.5 + (math.pi if self.flip else 0),
+                                             2 + rng.random())
+        elif self.game.rng.enemies.random() < 0.01:
+            self.walking = self.game.rng.enemies.randint(30, 120)
+
+        self.step(tilemap, move_x, move_y)
+
+        if move_x != 0:
             self.set_action('run')
         else:
             self.set_action('idle')
 
-        if abs(self.game.player.dashing) >= 50:
-            if self.rect().colliderect(self.game.player.rect()):
-                self.game.screenshake = max(16, self.game.screenshake)
-                self.game.sfx['hit'].play()
-                for i in range(30):
-                    angle = random.random() * math.pi * 2
-                    speed = random.random() * 5
-                    self.game.sparks.append(Spark(self.rect().center, angle, 2 + random.random()))
-                    self.game.particles.append(Particle(self.game, 'particle', self.rect().center,
-                                                        velocity=[math.cos(angle + math.pi) * speed * 0.5,
-                                                                  math.sin(angle + math.pi) * speed * 0.5],
-                                                        frame=random.randint(0, 7)))
-                self.game.sparks.append(Spark(self.rect().center, 0, 5 + random.random()))
-                self.game.sparks.append(Spark(self.rect().center, math.pi, 5 + random.random()))
-                return True
+    def die(self):
+        """Plays the hit effects of the dashing player running through the enemy"""
+        self.game.screenshake = max(16, self.game.screenshake)
+        self.game.sfx['hit'].play()
+        center = self.rect().center
+        rng = self.game.rng.effects
+        for i in range(30):
+            angle = rng.random() * math.pi * 2
+            speed = rng.random() * 5
+            self.game.sparks.add(center, angle, 2 + rng.random())
+            self.game.particles.add('particle', center,
+                                    velocity=[math.cos(angle + math.pi) * speed * 0.5,
+                                              math.sin(angle + math.pi) * speed * 0.5],
+                                    frame=rng.randint(0, 7))
+        self.game.sparks.add(center, 0, 5 + rng.random())
+        self.game.sparks.add(center, math.pi, 5 + rng.random())
 
     def render(self, surf, offset=(0, 0)):
-        """Renders the enemy and its gun on the screen"""
-        super().render(surf, offset=offset)
+        """Renders the enemy and its gun on the screen, returning the area drawn on"""
+        body_rect = super().render(surf, offset=offset)
 
+        pos = self.render_pos()
+        centerx = int(pos[0]) + self.size[0] // 2
+        centery = int(pos[1]) + self.size[1] // 2
         if self.flip:
-            surf.blit(pygame.transform.flip(self.game.assets['gun'], True, False), (
-                self.rect().centerx - 4 - self.game.assets['gun'].get_width() - offset[0],
-                self.rect().centery - offset[1]))
+            gun_rect = surf.blit(self.game.render_cache.flipped(self.game.assets['gun']), (
+                centerx - 4 - self.game.assets['gun'].get_width() - offset[0],
+                centery - offset[1]))
         else:
-            surf.blit(self.game.assets['gun'], (self.rect().centerx + 4 - offset[0], self.rect().centery - offset[1]))
+            gun_rect = surf.blit(self.game.assets['gun'], (centerx + 4 - offset[0], centery - offset[1]))
+        return body_rect.union(gun_rect)
 
 
 class Player(PhysicsEntity):
+    __slots__ = ('air_time', 'jumps', 'wall_slide', 'dashing', 'emoji_font', 'emoji')
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'player', pos, size)
         self.air_time = 0
@@ -165,7 +273,7 @@ class Player(PhysicsEntity):
 
     def update(self, tilemap, movement=(0, 0)):
         """Manages the player's movement and actions, updates player position based on input and applies gravity"""
-        super().update(tilemap, movement=movement)
+        self.step(tilemap, movement[0], movement[1])
 
         self.air_time += 1
 
@@ -196,13 +304,13 @@ class Player(PhysicsEntity):
             else:
                 self.set_action('idle')
 
+        rng = self.game.rng.effects
         if abs(self.dashing) in {60, 50}:
             for i in range(20):
-                angle = random.random() * math.pi * 2
-                speed = random.random() * 0.5 + 0.5
+                angle = rng.random() * math.pi * 2
+                speed = rng.random() * 0.5 + 0.5
                 pvelocity = [math.cos(angle) * speed, math.sin(angle) * speed]
-                self.game.particles.append(
-                    Particle(self.game, 'particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7)))
+                self.game.particles.add('particle', self.rect().center, velocity=pvelocity, frame=rng.randint(0, 7))
         if self.dashing > 0:
             self.dashing = max(0, self.dashing - 1)
         if self.dashing < 0:
@@ -211,9 +319,8 @@ class Player(PhysicsEntity):
             self.velocity[0] = abs(self.dashing) / self.dashing * 8
             if abs(self.dashing) == 51:
                 self.velocity[0] *= 0.1
-            pvelocity = [abs(self.dashing) / self.dashing * random.random() * 3, 0]
-            self.game.particles.append(
-                Particle(self.game, 'particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7)))
+            pvelocity = [abs(self.dashing) / self.dashing * rng.random() * 3, 0]
+            self.game.particles.add('particle', self.rect().center, velocity=pvelocity, frame=rng.randint(0, 7))
 
         if self.velocity[0] > 0:
             self.velocity[0] = max(self.velocity[0] - 0.1, 0)
@@ -221,14 +328,18 @@ class Player(PhysicsEntity):
             self.velocity[0] = min(self.velocity[0] + 0.1, 0)
 
     def render(self, surf, offset=(0, 0)):
+        """Renders the player and the emoji above it, returning the area drawn on"""
+        body_rect = None
         if abs(self.dashing) <= 50:
-            super().render(surf, offset=offset)
+            body_rect = super().render(surf, offset=offset)
 
-        emoji_surface = self.emoji_font.render(self.emoji, True, (255, 255, 255))
-        emoji_x = self.pos[0] - offset[0] + self.size[0] / 2 - emoji_surface.get_width() / 2
-        emoji_y = self.pos[1] - offset[
+        pos = self.render_pos()
+        emoji_surface = self.game.render_cache.text(self.emoji_font, self.emoji, (255, 255, 255))
+        emoji_x = pos[0] - offset[0] + self.size[0] / 2 - emoji_surface.get_width() / 2
+        emoji_y = pos[1] - offset[
             1] - emoji_surface.get_height() - 5  # Adjust -5 for the gap between emoji and character
-        surf.blit(emoji_surface, (emoji_x, emoji_y))
+        emoji_rect = surf.blit(emoji_surface, (emoji_x, emoji_y))
+        return body_rect.union(emoji_rect) if body_rect else emoji_rect
 
     def jump(self):
         """Handles the player's jumping logic, including wall jumps and regular jumps."""
@@ -0,0 +1,99 @@
+"""Compact per-tick input logs for recording a session and replaying it exactly.
+
+A log holds the seed the game's random streams were started from (see scripts/rng.py), the level and lives
+the session started with, its length in ticks and every action applied by Game.update. Actions are
+stored as one varint each: the number of ticks since the previous action, shifted left by three bits, with
+the action's index in ACTIONS in the low bits. Ticks without input cost nothing, so an hour of play is a
+few kilobytes.
+"""
+import struct
+
+ACTIONS = ['left_down', 'left_up', 'right_down', 'right_up', 'jump', 'dash']
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+MAGIC = b'EEIN'
+VERSION = 1
+HEADER = struct.Struct('<4sHQBBI')
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    """Returns (value, position after it)."""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class InputRecorder:
+    """Collects the actions of each tick; save() writes them as an input log."""
+
+    def __init__(self, seed, level=0, lives=3):
+        self.seed = seed
+        self.level = level
+        self.lives = lives
+        self.ticks = 0
+        self.last_tick = 0
+        self.body = bytearray()
+
+    def tick(self, actions):
+        """Records the actions applied in the current tick and moves on to the next one."""
+        for action in actions:
+            write_varint(self.body, (self.ticks - self.last_tick) << 3 | ACTION_CODES[action])
+            self.last_tick = self.ticks
+        self.ticks += 1
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.seed, self.level, self.lives, self.ticks))
+            f.write(self.body)
+
+
+class InputLog:
+    """A recorded session, read by load(); inputs() yields the actions of each of its ticks."""
+
+    def __init__(self, seed, level, lives, ticks, events):
+        self.seed = seed
+        self.level = level
+        self.lives = lives
+        self.ticks = ticks
+        self.events = events
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f'{path}: not an input log')
+        magic, version, seed, level, lives, ticks = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path}: not an input log of version {VERSION}')
+
+        events = []
+        tick = 0
+        pos = HEADER.size
+        while pos < len(data):
+            value, pos = read_varint(data, pos)
+            tick += value >> 3
+            events.append((tick, ACTIONS[value & 7]))
+        return cls(seed, level, lives, ticks, events)
+
+    def inputs(self):
+        """Yields the list of actions of every tick of the session, in order."""
+        events = self.events
+        i = 0
+        for tick in range(self.ticks):
+            actions = []
+            while i < len(events) and events[i][0] == tick:
+                actions.append(events[i][1])
+                i += 1
+            yield actions
@@ -0,0 +1,70 @@
+"""Background loading of slow resources (sounds, music, maps) behind futures"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class BackgroundLoader:
+    """Runs loading jobs on a worker thread and reports how far the current batch has got.
+
+    Jobs submitted while the previous batch is still running join it, so progress() always covers
+    everything the loading screen is waiting for. A required job that raised re-raises from check() on the
+    main thread, the same way a synchronous load would have; optional jobs (sounds, music) leave handling
+    their failure to whoever waits on them, so a missing one never stops the game. Work that has to happen
+    on the main thread once a job is done (starting music, swapping in sounds) is registered with
+    when_done() and run by poll().
+    """
+
+    def __init__(self, workers=1):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='loader')
+        self.jobs = []
+        self.callbacks = []
+
+    def submit(self, label, fn, *args, optional=False):
+        """Schedules fn(*args) and returns its future; 'label' names the job on the loading screen."""
+        if self.idle():
+            self.jobs = []
+        future = self.executor.submit(fn, *args)
+        self.jobs.append((label, future, optional))
+        return future
+
+    def when_done(self, future, fn):
+        """Has the next poll() after the future finishes call fn(future) on the polling thread."""
+        self.callbacks.append((future, fn))
+
+    def poll(self):
+        """Runs the when_done() callbacks of the jobs that have finished; call it from the main loop."""
+        if not self.callbacks:
+            return
+        finished = [(future, fn) for future, fn in self.callbacks if future.done()]
+        if finished:
+            self.callbacks = [(future, fn) for future, fn in self.callbacks if not future.done()]
+            for future, fn in finished:
+                fn(future)
+
+    def idle(self):
+        return all(future.done() for label, future, optional in self.jobs)
+
+    def progress(self):
+        """Returns (finished jobs, jobs in the batch, label of the first unfinished job or None)."""
+        done = 0
+        current = None
+        for label, future, optional in self.jobs:
+            if future.done():
+                done += 1
+            elif current is None:
+                current = label
+        return done, len(self.jobs), current
+
+    def wait(self, timeout=None):
+        """Blocks until a job of the batch finishes, the timeout expires or nothing is pending."""
+        pending = [future for label, future, optional in self.jobs if not future.done()]
+        if pending:
+            wait(pending, timeout, return_when=FIRST_COMPLETED)
+
+    def check(self):
+        """Re-raises the error of the first finished required job that failed."""
+        for label, future, optional in self.jobs:
+            if not optional and future.done() and future.exception() is not None:
+                raise future.exception()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
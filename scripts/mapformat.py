@@ -0,0 +1,386 @@
+"""Compact binary map format, readable and writable alongside the JSON maps.
+
+Layout (little-endian):
+
+    header    magic b'EEMP', version u16, flags u16, tile_size u16, chunk_size u16,
+              chunk count u32, off-grid tile count u32, (version 2) off-grid group count u32
+    palette   u16 count, then per tile type a u8 length and its UTF-8 name
+    body      chunk x coordinates i32[chunks], chunk y coordinates i32[chunks],
+              per chunk its type IDs u8[chunk_size^2] then its variants u16[chunk_size^2],
+              off-grid type IDs u16[n], variants u16[n], x f64[n], y f64[n],
+              (version 2) draw order u32[n], then per group chunk x i32, chunk y i32, first tile u32, count u32
+
+Type IDs index the palette offset by one (0 is an empty cell), the same encoding TileChunk uses in memory,
+so chunks are loaded by copying their bytes. Version 2 stores the off-grid tiles grouped by the chunk their
+position lies in, so a chunk's decor and spawners can be streamed with it (see MapFile). With
+FLAG_COMPRESSED the body is zlib-compressed; otherwise the file is memory-mapped and only the bytes that
+are used get paged in.
+
+Usage:
+    python -m scripts.mapformat convert SRC DST [--compress]   (direction picked from the extensions)
+    python -m scripts.mapformat bench [--width W] [--height H] [--repeat N]   (whole and streamed loads)
+"""
+import os
+import sys
+import json
+import math
+import mmap
+import time
+import zlib
+import random
+import struct
+import argparse
+import tempfile
+import tracemalloc
+from array import array
+
+MAGIC = b'EEMP'
+FORMAT_VERSION = 2
+FLAG_COMPRESSED = 1
+HEADER = struct.Struct('<4sHHHHII')
+HEADER_V2 = struct.Struct('<I')
+BINARY_EXTENSION = '.map'
+JSON_EXTENSION = '.json'
+MAP_FOLDER = 'data/maps'
+"""The body is stored little-endian; arrays are swapped to and from the host's order when it differs"""
+SWAP_BYTES = sys.byteorder != 'little'
+
+
+def map_path(map_id, folder=MAP_FOLDER):
+    """Returns the file to load for a map ID: the binary map unless the JSON one was saved after it."""
+    base = os.path.join(folder, str(map_id))
+    binary, text = base + BINARY_EXTENSION, base + JSON_EXTENSION
+    if os.path.exists(binary) and (not os.path.exists(text) or os.path.getmtime(binary) >= os.path.getmtime(text)):
+        return binary
+    return text
+
+
+def map_ids(folder=MAP_FOLDER):
+    """Returns the sorted numeric IDs of the maps in a folder, whichever formats they are saved in."""
+    ids = set()
+    for name in os.listdir(folder):
+        stem, ext = os.path.splitext(name)
+        if ext in (BINARY_EXTENSION, JSON_EXTENSION) and stem.isdigit():
+            ids.add(int(stem))
+    return sorted(ids)
+
+
+def _number(value):
+    """Positions are stored as doubles; whole numbers come back as ints, as most JSON maps write them"""
+    return int(value) if value.is_integer() else value
+
+
+def _packed(typecode, values):
+    """Returns the values as a little-endian array of the given type, as bytes"""
+    packed = array(typecode, values)
+    if SWAP_BYTES:
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _view(body, offset, count, typecode):
+    """Returns a typed view of 'count' items of the body and the offset just past them: zero-copy on
+    little-endian hosts, a view of a byte-swapped copy on the others
+    """
+    size = array(typecode).itemsize * count
+    if SWAP_BYTES:
+        values = array(typecode)
+        values.frombytes(body[offset:offset + size])
+        values.byteswap()
+        return memoryview(values), offset + size
+    return body[offset:offset + size].cast(typecode), offset + size
+
+
+def offgrid_chunk(tile, chunk_px):
+    """Returns the key of the chunk an off-grid tile's position lies in"""
+    return math.floor(tile['pos'][0] / chunk_px), math.floor(tile['pos'][1] / chunk_px)
+
+
+def write(path, tile_size, chunk_size, palette, chunks, offgrid, compress=False):
+    """Writes a binary map.
+
+    'chunks' maps (cx, cy) to (types, variants) arrays in TileChunk's encoding against 'palette', and
+    'offgrid' is the list of off-grid tile dicts in drawing order.
+    """
+    ids = {tile_type: i + 1 for i, tile_type in enumerate(palette)}
+    names = list(palette)
+    for tile in offgrid:
+        if tile['type'] not in ids:
+            names.append(tile['type'])
+            ids[tile['type']] = len(names)
+
+    palette_bytes = bytearray(struct.pack('<H', len(names)))
+    for name in names:
+        encoded = name.encode('utf-8')
+        palette_bytes += struct.pack('<B', len(encoded)) + encoded
+
+    keys = sorted(chunks)
+    body = bytearray()
+    body += _packed('i', [key[0] for key in keys])
+    body += _packed('i', [key[1] for key in keys])
+    for key in keys:
+        types, variants = chunks[key]
+        body += array('B', types).tobytes()
+        body += _packed('H', variants)
+
+    """Group the off-grid tiles by chunk so a chunk's tiles are one contiguous run; 'order' keeps the draw order"""
+    chunk_px = chunk_size * tile_size
+    order = sorted(range(len(offgrid)), key=lambda i: offgrid_chunk(offgrid[i], chunk_px))
+    tiles = [offgrid[i] for i in order]
+    body += _packed('H', [ids[tile['type']] for tile in tiles])
+    body += _packed('H', [tile['variant'] for tile in tiles])
+    body += _packed('d', [tile['pos'][0] for tile in tiles])
+    body += _packed('d', [tile['pos'][1] for tile in tiles])
+    body += _packed('I', order)
+
+    groups = {}
+    for i, tile in enumerate(tiles):
+        key = offgrid_chunk(tile, chunk_px)
+        start, count = groups.get(key, (i, 0))
+        groups[key] = (start, count + 1)
+    group_keys = list(groups)
+    body += _packed('i', [key[0] for key in group_keys])
+    body += _packed('i', [key[1] for key in group_keys])
+    body += _packed('I', [groups[key][0] for key in group_keys])
+    body += _packed('I', [groups[key][1] for key in group_keys])
+
+    flags = FLAG_COMPRESSED if compress else 0
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, tile_size, chunk_size, len(keys), len(offgrid)))
+        f.write(HEADER_V2.pack(len(group_keys)))
+        f.write(palette_bytes)
+        f.write(zlib.compress(body) if compress else body)
+
+
+class MapFile:
+    """Random access to the chunks and off-grid tiles of a binary map.
+
+    Opening a map only reads its header, palette and chunk tables. An uncompressed file stays memory-mapped
+    and every chunk or group of off-grid tiles is read from the mapping when asked for, so the cost of
+    streaming a level depends on how much of it is visited rather than on its size.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = self.data
+        magic, self.version, flags, self.tile_size, self.chunk_size, chunk_count, offgrid_count = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a binary map')
+        if self.version > FORMAT_VERSION:
+            self.close()
+            raise ValueError(f'{path} uses map format version {self.version}, newer than {FORMAT_VERSION}')
+
+        offset = HEADER.size
+        group_count = 0
+        if self.version >= 2:
+            group_count, = HEADER_V2.unpack_from(data, offset)
+            offset += HEADER_V2.size
+        self.palette = []
+        count, = struct.unpack_from('<H', data, offset)
+        offset += 2
+        for i in range(count):
+            length = data[offset]
+            self.palette.append(data[offset + 1:offset + 1 + length].decode('utf-8'))
+            offset += 1 + length
+
+        if flags & FLAG_COMPRESSED:
+            self.body = memoryview(zlib.decompress(data[offset:]))
+        else:
+            self.body = memoryview(data)[offset:]
+        body = self.body
+        self.cells = self.chunk_size * self.chunk_size
+
+        xs, offset = _view(body, 0, chunk_count, 'i')
+        ys, offset = _view(body, offset, chunk_count, 'i')
+        self.chunk_offsets = {}
+        for i, key in enumerate(zip(xs, ys)):
+            self.chunk_offsets[key] = offset + i * 3 * self.cells
+        xs.release()
+        ys.release()
+        offset += chunk_count * 3 * self.cells
+
+        n = self.offgrid_count = offgrid_count
+        self.types, offset = _view(body, offset, n, 'H')
+        self.variants, offset = _view(body, offset, n, 'H')
+        self.xs, offset = _view(body, offset, n, 'd')
+        self.ys, offset = _view(body, offset, n, 'd')
+        self.groups = {}
+        if self.version >= 2:
+            self.order, offset = _view(body, offset, n, 'I')
+            xs, offset = _view(body, offset, group_count, 'i')
+            ys, offset = _view(body, offset, group_count, 'i')
+            starts, offset = _view(body, offset, group_count, 'I')
+            counts, offset = _view(body, offset, group_count, 'I')
+            for key, start, count in zip(zip(xs, ys), starts, counts):
+                self.groups[key] = range(start, start + count)
+            for view in (xs, ys, starts, counts):
+                view.release()
+        else:
+            """Version 1 kept the off-grid tiles in drawing order only"""
+            self.order = range(n)
+            chunk_px = self.chunk_size * self.tile_size
+            for i in range(n):
+                key = math.floor(self.xs[i] / chunk_px), math.floor(self.ys[i] / chunk_px)
+                self.groups.setdefault(key, []).append(i)
+
+    def chunk(self, key):
+        """Returns a chunk's (types, variants) bytes in the palette's encoding, or None if it is empty."""
+        offset = self.chunk_offsets.get(key)
+        if offset is None:
+            return None
+        cells = self.cells
+        variants = self.body[offset + cells:offset + 3 * cells]
+        if SWAP_BYTES:
+            variants = array('H', bytes(variants))
+            variants.byteswap()
+        return bytes(self.body[offset:offset + cells]), bytes(variants)
+
+    def tile(self, i):
+        """Returns off-grid tile i as a tile dict"""
+        return {'type': self.palette[self.types[i] - 1], 'variant': self.variants[i],
+                'pos': [_number(self.xs[i]), _number(self.ys[i])]}
+
+    def offgrid(self, key):
+        """Returns [(draw order, tile)] for the off-grid tiles positioned in a chunk."""
+        return [(self.order[i], self.tile(i)) for i in self.groups.get(key, ())]
+
+    def find_offgrid(self, tile_type, variant):
+        """Returns [(chunk key, draw order, tile)] for every off-grid tile of a type and variant."""
+        if tile_type not in self.palette:
+            return []
+        type_id = self.palette.index(tile_type) + 1
+        types, variants = self.types, self.variants
+        return [(key, self.order[i], self.tile(i)) for key, indices in self.groups.items() for i in indices
+                if types[i] == type_id and variants[i] == variant]
+
+    def read_all(self):
+        """Returns the whole map in read()'s layout."""
+        chunks = {key: self.chunk(key) for key in self.chunk_offsets}
+        offgrid = sorted(((self.order[i], i) for i in range(self.offgrid_count)))
+        return {'tile_size': self.tile_size, 'chunk_size': self.chunk_size, 'palette': self.palette,
+                'chunks': chunks, 'offgrid': [self.tile(i) for order, i in offgrid]}
+
+    def close(self):
+        for name in ('types', 'variants', 'xs', 'ys', 'order', 'body'):
+            view = getattr(self, name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        self.data.close()
+
+
+def read(path):
+    """Reads a whole binary map into {'tile_size', 'chunk_size', 'palette', 'chunks', 'offgrid'}.
+
+    'chunks' maps (cx, cy) to (types, variants) byte strings in the palette's encoding.
+    """
+    map_file = MapFile(path)
+    try:
+        return map_file.read_all()
+    finally:
+        map_file.close()
+
+
+def convert(src, dst, compress=False):
+    """Converts a map between the JSON and binary formats, picking the direction from dst's extension."""
+    from scripts.tilemap import Tilemap
+
+    tilemap = Tilemap(None)
+    tilemap.load(src)
+    tilemap.save(dst, compress=compress)
+
+
+def generate(width, height, seed=0):
+    """Builds a large JSON-layout map: rolling terrain with decor, for benchmarking"""
+    rng = random.Random(seed)
+    tiles = {}
+    offgrid = []
+    ground = height // 2
+    for x in range(width):
+        ground = max(4, min(height - 4, ground + rng.choice((-1, 0, 0, 1))))
+        for y in range(ground, height):
+            tile_type = 'grass' if y < ground + 3 else 'stone'
+            tiles[f'{x};{y}'] = {'type': tile_type, 'variant': rng.randrange(9), 'pos': [x, y]}
+        if rng.random() < 0.1:
+            offgrid.append({'type': 'large_decor', 'variant': rng.randrange(3), 'pos': [x * 16, ground * 16 - 30]})
+    return {'tilemap': tiles, 'tile_size': 16, 'offgrid': offgrid}
+
+
+def load_whole(path):
+    from scripts.tilemap import Tilemap
+
+    tilemap = Tilemap(None)
+    tilemap.load(path)
+    return tilemap
+
+
+def load_streamed(path):
+    """Opens the map for streaming and streams in one screen around its left end, as the game does"""
+    from scripts.streaming import StreamingTilemap, open_map
+
+    tilemap = StreamingTilemap(None)
+    tilemap.load_data(open_map(path))
+    tilemap.stream([(0, 0, 320, 240)])
+    return tilemap
+
+
+def measure(load, path, repeat):
+    """Returns (best load seconds, bytes still allocated by the loaded Tilemap, peak bytes during load)"""
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        load(path)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    tilemap = load(path)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tilemap
+    return best, current, peak
+
+
+def bench(width, height, repeat):
+    with tempfile.TemporaryDirectory() as folder:
+        paths = {'json': os.path.join(folder, 'map.json'),
+                 'binary': os.path.join(folder, 'map.map'),
+                 'binary+zlib': os.path.join(folder, 'map_z.map')}
+        with open(paths['json'], 'w') as f:
+            json.dump(generate(width, height), f)
+        convert(paths['json'], paths['binary'])
+        convert(paths['json'], paths['binary+zlib'], compress=True)
+
+        print(f'{width}x{height} map, best of {repeat} loads')
+        runs = [(name, load_whole, path) for name, path in paths.items()]
+        runs.append(('streamed', load_streamed, paths['binary']))
+        for name, load, path in runs:
+            seconds, current, peak = measure(load, path, repeat)
+            print(f'  {name:<12} file {os.path.getsize(path) / 1024:9.0f} KiB   load {seconds * 1000:8.1f} ms   '
+                  f'resident {current / 1024:8.0f} KiB   peak {peak / 1024:8.0f} KiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert and benchmark map files')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help='convert a map between .json and .map')
+    convert_parser.add_argument('src')
+    convert_parser.add_argument('dst')
+    convert_parser.add_argument('--compress', action='store_true', help='zlib-compress the binary body')
+    bench_parser = commands.add_parser('bench', help='compare JSON and binary loading on a generated map')
+    bench_parser.add_argument('--width', type=int, default=2000)
+    bench_parser.add_argument('--height', type=int, default=200)
+    bench_parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        convert(args.src, args.dst, compress=args.compress)
+        print(f'{args.src} -> {args.dst} ({os.path.getsize(args.dst)} bytes)', file=sys.stderr)
+    else:
+        bench(args.width, args.height, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Wrapping background layers that scroll with parallax, each drawn from one pre-composited strip"""
+import pygame
+
+
+class ParallaxLayer:
+    """A set of sprites that scroll together, repeating every 'period' pixels in both directions.
+
+    The layer moves 'depth' times as fast as the camera and drifts 'speed' pixels per update. Its sprites
+    are composited once into a strip two periods wide, so any view no larger than a period is covered by
+    one area of the strip, split in two where it wraps vertically: a frame costs at most two blits however
+    many sprites the layer holds. Sprites use black as the colorkey, like the game's images.
+    """
+
+    def __init__(self, period, depth, speed=0):
+        self.period = (int(period[0]), int(period[1]))
+        self.depth = depth
+        self.speed = speed
+        self.scroll = 0
+        self.sprites = []
+        self.strip = None
+
+    def add(self, img, pos):
+        """Adds a sprite at a position within the period; the strip is rebuilt on the next render."""
+        self.sprites.append((img, (int(pos[0]) % self.period[0], int(pos[1]) % self.period[1])))
+        self.strip = None
+
+    def build_strip(self):
+        width, height = self.period
+        strip = pygame.Surface((width * 2, height))
+        strip.fill((0, 0, 0))
+        for img, (x, y) in self.sprites:
+            """Sprites crossing the right or bottom edge also show at the start of the next period"""
+            for dx in (-width, 0, width):
+                for dy in (-height, 0):
+                    strip.blit(img, (x + dx, y + dy))
+        strip.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+        self.strip = strip
+
+    def update(self):
+        self.scroll += self.speed
+
+    def render(self, surf, offset=(0, 0)):
+        if not self.sprites:
+            return
+        if self.strip is None:
+            self.build_strip()
+        width, height = self.period
+        view_width = min(surf.get_width(), width)
+        view_height = min(surf.get_height(), height)
+        x = int(offset[0] * self.depth - self.scroll) % width
+        y = int(offset[1] * self.depth) % height
+        top = min(view_height, height - y)
+        surf.blit(self.strip, (0, 0), (x, y, view_width, top))
+        if top < view_height:
+            surf.blit(self.strip, (0, top), (x, 0, view_width, view_height - top))
+
+
+class ParallaxBackground:
+    """Layers drawn back to front, the ones that follow the camera least first."""
+
+    def __init__(self, layers=()):
+        self.layers = []
+        for layer in layers:
+            self.add(layer)
+
+    def add(self, layer):
+        self.layers.append(layer)
+        self.layers.sort(key=lambda layer: layer.depth)
+
+    def update(self):
+        for layer in self.layers:
+            layer.update()
+
+    def render(self, surf, offset=(0, 0)):
+        for layer in self.layers:
+            layer.render(surf, offset=offset)
@@ -1,31 +1,95 @@
-"""Designed to represent and manage individual particles in the game"""
+"""Designed to simulate and draw all of the game's particles as one batch"""
+import math
 
 
-class Particle:
-    def __init__(self, game, p_type, pos, velocity=None, frame=0):
+class ParticleSystem:
+    """Stores particles as parallel arrays (struct of arrays) instead of one object per particle.
+
+    Each particle type borrows the frames and timing of the game's 'particle/<type>' animation. Dead
+    particles are compacted away by swapping the last live particle into their slot.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.type_names = []
+        self.type_ids = {}
+        self.type_frames = []
+        self.type_durations = []
+        self.type_last_frames = []
+        self.clear()
+
+    def clear(self):
+        self.types = []
+        self.x = []
+        self.y = []
+        self.vx = []
+        self.vy = []
+        self.frames = []
+        self.dead = []
+
+    def __len__(self):
+        return len(self.x)
+
+    def type_id(self, p_type):
+        type_id = self.type_ids.get(p_type)
+        if type_id is None:
+            animation = self.game.assets['particle/' + p_type]
+            type_id = len(self.type_names)
+            self.type_ids[p_type] = type_id
+            self.type_names.append(p_type)
+            self.type_frames.append(animation.images)
+            self.type_durations.append(animation.img_duration)
+            self.type_last_frames.append(animation.img_duration * len(animation.images) - 1)
+        return type_id
+
+    def add(self, p_type, pos, velocity=None, frame=0):
+        """Spawns a particle of the given type."""
         if velocity is None:
             velocity = [0, 0]
-        self.game = game
-        self.type = p_type
-        self.pos = list(pos)
-        self.velocity = list(velocity)
-        self.animation = self.game.assets['particle/' + p_type].copy()
-        self.animation.frame = frame
+        self.types.append(self.type_id(p_type))
+        self.x.append(pos[0])
+        self.y.append(pos[1])
+        self.vx.append(velocity[0])
+        self.vy.append(velocity[1])
+        self.frames.append(frame)
+        self.dead.append(False)
 
-    def update(self):
-        """Updates the state of the particle."""
-        kill = False
-        if self.animation.done:
-            kill = True
+    def remove(self, i):
+        """Removes particle i by moving the last particle into its slot."""
+        for column in (self.types, self.x, self.y, self.vx, self.vy, self.frames, self.dead):
+            last = column.pop()
+            if i < len(column):
+                column[i] = last
 
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
+    def update(self):
+        """Advances every particle one frame.
 
-        self.animation.update()
+        Particles whose animation finished on the previous update are dropped first, so each particle is
+        still drawn once on its final frame.
+        """
+        i = len(self.dead) - 1
+        while i >= 0:
+            if self.dead[i]:
+                self.remove(i)
+            i -= 1
 
-        return kill
+        types, x, y, vx, vy, frames, dead = self.types, self.x, self.y, self.vx, self.vy, self.frames, self.dead
+        last_frames = self.type_last_frames
+        leaf = self.type_ids.get('leaf')
+        for i in range(len(x)):
+            last = last_frames[types[i]]
+            dead[i] = frames[i] >= last
+            x[i] += vx[i]
+            y[i] += vy[i]
+            frames[i] = min(frames[i] + 1, last)
+            if types[i] == leaf:
+                x[i] += math.sin(frames[i] * 0.035) * 0.3
 
     def render(self, surf, offset=(0, 0)):
-        img = self.animation.img()
-        surf.blit(img, (self.pos[0] - offset[0] - img.get_width() // 2,
-                        self.pos[1] - offset[1] - img.get_height() // 2))
+        type_frames = self.type_frames
+        durations = self.type_durations
+        blits = []
+        for p_type, px, py, frame in zip(self.types, self.x, self.y, self.frames):
+            img = type_frames[p_type][int(frame / durations[p_type])]
+            blits.append((img, (px - offset[0] - img.get_width() // 2, py - offset[1] - img.get_height() // 2)))
+        surf.blits(blits, doreturn=False)
@@ -0,0 +1,50 @@
+"""Presents frames on the window, pushing only the parts that changed to the display"""
+import pygame
+
+
+def same_format(a, b):
+    return a.get_bitsize() == b.get_bitsize() and a.get_masks() == b.get_masks()
+
+
+class Presenter:
+    """Scales frames onto the window and presents only its damaged areas.
+
+    scale() stretches a low resolution frame over the whole window without allocating: it scales straight
+    into the window surface when the frame isn't offset (screenshake) and the formats match, and otherwise
+    into a target surface that is allocated once and blitted at the offset. damage() marks the areas drawn
+    on the window some other way, and present() pushes the damaged areas to the display, or does nothing when
+    nothing was damaged since the last present.
+    """
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.target = None
+        self.dirty = []
+
+    def scale(self, surf, offset=(0, 0)):
+        screen = self.screen
+        size = screen.get_size()
+        if not int(offset[0]) and not int(offset[1]) and same_format(surf, screen):
+            pygame.transform.scale(surf, size, screen)
+        else:
+            if self.target is None or self.target.get_size() != size or not same_format(surf, self.target):
+                self.target = pygame.Surface(size, 0, surf)
+            pygame.transform.scale(surf, size, self.target)
+            screen.blit(self.target, offset)
+        self.damage(screen.get_rect())
+
+    def damage(self, rect=None):
+        """Marks an area of the window (all of it if None) as changed."""
+        self.dirty.append(self.screen.get_rect() if rect is None else pygame.Rect(rect))
+
+    def present(self):
+        """Updates the damaged areas of the display; returns whether there were any."""
+        if not self.dirty:
+            return False
+        screen_rect = self.screen.get_rect()
+        if any(rect.contains(screen_rect) for rect in self.dirty):
+            pygame.display.update()
+        else:
+            pygame.display.update(self.dirty)
+        self.dirty = []
+        return True
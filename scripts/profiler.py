@@ -0,0 +1,99 @@
+"""Lightweight per-stage timing for the game loop"""
+import json
+import time
+from collections import deque
+
+OVERLAY_REFRESH_FRAMES = 15
+
+
+class Profiler:
+    """Accumulates wall time per named stage between begin() and end() calls.
+
+    Besides running totals it keeps the stage timings of the last 'history' frames (see frame_start and
+    frame_end), which feed the rolling p50/p99 overlay and the Chrome trace export. When disabled, every
+    method returns immediately so the instrumentation can stay in the loop.
+    """
+
+    def __init__(self, enabled=False, history=300):
+        self.enabled = enabled
+        self.history = history
+        self.reset()
+
+    def reset(self):
+        self.totals = {}
+        self.counts = {}
+        self.started = {}
+        self.frames = deque(maxlen=self.history)
+        self.frame_events = None
+        self.overlay_lines = []
+        self.overlay_age = OVERLAY_REFRESH_FRAMES
+
+    def begin(self, name):
+        if not self.enabled:
+            return
+        self.started[name] = time.perf_counter_ns()
+
+    def end(self, name):
+        if not self.enabled:
+            return
+        start = self.started[name]
+        elapsed = time.perf_counter_ns() - start
+        self.totals[name] = self.totals.get(name, 0) + elapsed
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if self.frame_events is not None:
+            self.frame_events.append((name, start, elapsed))
+
+    def frame_start(self):
+        if not self.enabled:
+            return
+        self.frame_events = []
+        self.begin('frame')
+
+    def frame_end(self):
+        if not self.enabled or self.frame_events is None:
+            return
+        self.end('frame')
+        self.frames.append(self.frame_events)
+        self.frame_events = None
+        self.overlay_age += 1
+
+    def percentiles(self):
+        """Returns {stage: (p50_ms, p99_ms)} over the recorded frames, summing repeated stages per frame."""
+        per_stage = {}
+        for events in self.frames:
+            frame_totals = {}
+            for name, start, elapsed in events:
+                frame_totals[name] = frame_totals.get(name, 0) + elapsed
+            for name, elapsed in frame_totals.items():
+                per_stage.setdefault(name, []).append(elapsed)
+        stats = {}
+        for name, samples in per_stage.items():
+            samples.sort()
+            p99_index = min(len(samples) - 1, len(samples) * 99 // 100)
+            stats[name] = (samples[len(samples) // 2] / 1e6, samples[p99_index] / 1e6)
+        return stats
+
+    def render_overlay(self, surf, font, pos=(5, 5)):
+        """Draws the rolling per-stage p50/p99 timings; the numbers are refreshed every few frames."""
+        if not self.enabled:
+            return
+        if self.overlay_age >= OVERLAY_REFRESH_FRAMES:
+            self.overlay_age = 0
+            stats = sorted(self.percentiles().items(), key=lambda item: -item[1][1])
+            lines = ['stage              p50 ms   p99 ms']
+            lines += [f'{name:<16} {p50:8.2f} {p99:8.2f}' for name, (p50, p99) in stats]
+            self.overlay_lines = [font.render(line, True, (255, 255, 255), (0, 0, 0)) for line in lines]
+        y = pos[1]
+        for line in self.overlay_lines:
+            surf.blit(line, (pos[0], y))
+            y += line.get_height()
+
+    def export_trace(self, path):
+        """Writes the recorded frames as a Chrome trace (chrome://tracing, Perfetto) JSON file."""
+        events = []
+        for frame in self.frames:
+            for name, start, elapsed in frame:
+                events.append({'name': name, 'ph': 'X', 'ts': start / 1000, 'dur': elapsed / 1000, 'pid': 0, 'tid': 0})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
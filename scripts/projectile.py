@@ -0,0 +1,111 @@
+"""Designed to move, collide and draw every enemy projectile as one batch"""
+
+
+class ProjectileSystem:
+    """Stores projectiles as parallel lists of position, horizontal speed and age.
+
+    Projectiles only travel horizontally, so each one keeps the tile row it flies through. Tile collisions
+    are only re-queried when a projectile enters a new column, and target queries only look at the rows
+    the target overlaps.
+    """
+
+    def __init__(self, img, tile_size=16, max_age=360):
+        self.img = img
+        self.tile_size = tile_size
+        self.max_age = max_age
+        self.x = []
+        self.y = []
+        self.speed = []
+        self.age = []
+        self.tile_x = []
+        self.row = []
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.x)
+
+    def clear(self):
+        for column in (self.x, self.y, self.speed, self.age, self.tile_x, self.row):
+            column.clear()
+        self.rows = {}
+
+    def add(self, pos, speed):
+        """Fires a projectile from pos; a negative speed travels left."""
+        self.x.append(pos[0])
+        self.y.append(pos[1])
+        self.speed.append(speed)
+        self.age.append(0)
+        self.tile_x.append(None)
+        row = int(pos[1] // self.tile_size)
+        self.row.append(row)
+        """The new slot is the highest index, so appending keeps the row's bucket sorted as index_rows() would"""
+        bucket = self.rows.get(row)
+        if bucket is None:
+            self.rows[row] = [len(self.x) - 1]
+        else:
+            bucket.append(len(self.x) - 1)
+
+    def remove(self, indices):
+        """Removes projectiles by index, moving the last projectiles into the freed slots."""
+        for i in sorted(indices, reverse=True):
+            for column in (self.x, self.y, self.speed, self.age, self.tile_x, self.row):
+                last = column.pop()
+                if i < len(column):
+                    column[i] = last
+        self.index_rows()
+
+    def index_rows(self):
+        """Rebuilds the row buckets from scratch, after removals have moved projectiles between slots."""
+        rows = {}
+        for i, row in enumerate(self.row):
+            if row in rows:
+                rows[row].append(i)
+            else:
+                rows[row] = [i]
+        self.rows = rows
+
+    def update(self, tilemap):
+        """Moves and ages every projectile, then drops the ones that hit a wall or expired.
+
+        Returns the (pos, speed) of each projectile that hit a solid tile.
+        """
+        x, speed, age, tile_x, row = self.x, self.speed, self.age, self.tile_x, self.row
+        size = self.tile_size
+        hits = []
+        dead = []
+        for i in range(len(x)):
+            x[i] += speed[i]
+            age[i] += 1
+            column = int(x[i] // size)
+            if column != tile_x[i]:
+                tile_x[i] = column
+                if tilemap.solid_at(column, row[i]):
+                    hits.append(([x[i], self.y[i]], speed[i]))
+                    dead.append(i)
+                    continue
+            if age[i] > self.max_age:
+                dead.append(i)
+        if dead:
+            self.remove(dead)
+        return hits
+
+    def collide_rect(self, rect):
+        """Removes and returns the positions of the projectiles inside a rect."""
+        hits = []
+        x, y = self.x, self.y
+        for row in range(rect.top // self.tile_size, (rect.bottom - 1) // self.tile_size + 1):
+            for i in self.rows.get(row, ()):
+                if rect.collidepoint(x[i], y[i]):
+                    hits.append(i)
+        if not hits:
+            return []
+        positions = [[x[i], y[i]] for i in hits]
+        self.remove(hits)
+        return positions
+
+    def render(self, surf, offset=(0, 0)):
+        """Draws every projectile and returns the rects drawn on"""
+        img = self.img
+        half_w = img.get_width() / 2 + offset[0]
+        half_h = img.get_height() / 2 + offset[1]
+        return surf.blits([(img, (px - half_w, py - half_h)) for px, py in zip(self.x, self.y)])
@@ -0,0 +1,50 @@
+"""Shared cache for surfaces derived from other surfaces or fonts"""
+from collections import OrderedDict
+
+import pygame
+
+
+class RenderCache:
+    """Memoizes flipped sprites and rendered text so they aren't rebuilt every frame.
+
+    Entries are keyed by the identity of the source image or font plus the render state, and hold a
+    reference to the source so its id can't be reused while the entry lives. The least recently used
+    entries are evicted once 'max_entries' is reached.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, build):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        source, surf = build()
+        self.entries[key] = (source, surf)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surf
+
+    def flipped(self, img, flip_x=True, flip_y=False):
+        """Returns img mirrored horizontally and/or vertically."""
+        if not (flip_x or flip_y):
+            return img
+        return self.get(('flip', id(img), flip_x, flip_y),
+                        lambda: (img, pygame.transform.flip(img, flip_x, flip_y)))
+
+    def text(self, font, text, color, antialias=True, background=None):
+        """Returns the surface of font.render(text, antialias, color, background)."""
+        return self.get(('text', id(font), text, tuple(color), antialias, background),
+                        lambda: (font, font.render(text, antialias, color, background)))
+
+    def clear(self):
+        self.entries.clear()
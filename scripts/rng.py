@@ -0,0 +1,23 @@
+"""Seeded random number streams, one per subsystem"""
+import random
+
+STREAMS = ['enemies', 'effects', 'leaves', 'clouds', 'screen']
+
+
+class RandomStreams:
+    """Holds one random.Random per subsystem (see STREAMS), all derived from a single seed.
+
+    Every subsystem draws from its own stream, so a game seeded the same way and given the same input
+    produces the same ticks, whether or not frames are rendered in between (the screenshake and the clouds
+    draw from streams the simulation never touches). Without a seed, a random one is picked.
+    """
+
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        if seed is None:
+            seed = random.randrange(2 ** 63)
+        self.base_seed = seed
+        for name in STREAMS:
+            setattr(self, name, random.Random(f'{seed}/{name}'))
@@ -0,0 +1,91 @@
+"""Draws the game's drop shadow: the silhouette of the display layer, offset by one pixel in each direction."""
+import pygame
+
+SHADOW_COLOR = (0, 0, 0, 180)
+SHADOW_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BLOCK_SIZE = 64
+MAX_CACHED_BLOCKS = 1024
+
+
+class ShadowRenderer:
+    """Renders the drop shadow without rebuilding the silhouette of the whole display every frame.
+
+    The shadow of the static level (tiles and decor) is baked once per BLOCK_SIZE block of the world.
+    Only the areas where something moved this frame (the rects returned by entity, projectile and spark
+    rendering) and the one-pixel border of the view are rebuilt from the display itself. All the pieces are
+    composited on one layer, which is blended onto the target with a single blit.
+    """
+
+    def __init__(self, tilemap):
+        self.tilemap = tilemap
+        self.blocks = {}
+        self.revision = None
+        self.layer = None
+
+    def block_shadow(self, bx, by):
+        """Returns the baked shadow of one world block, or None if nothing static is drawn there."""
+        key = (bx, by)
+        if key in self.blocks:
+            return self.blocks[key]
+        if len(self.blocks) >= MAX_CACHED_BLOCKS:
+            self.blocks = {}
+
+        static = pygame.Surface((BLOCK_SIZE, BLOCK_SIZE), pygame.SRCALPHA)
+        self.tilemap.render(static, offset=(bx * BLOCK_SIZE, by * BLOCK_SIZE))
+        mask = pygame.mask.from_surface(static)
+        shadow = None
+        if mask.count():
+            silhouette = mask.to_surface(setcolor=SHADOW_COLOR, unsetcolor=(0, 0, 0, 0))
+            shadow = pygame.Surface((BLOCK_SIZE + 2, BLOCK_SIZE + 2), pygame.SRCALPHA)
+            for offset in SHADOW_OFFSETS:
+                shadow.blit(silhouette, (1 + offset[0], 1 + offset[1]))
+        self.blocks[key] = shadow
+        return shadow
+
+    def render(self, display, target, offset=(0, 0), dynamic_rects=()):
+        """Blends the shadow of everything drawn on 'display' so far onto 'target'.
+
+        'dynamic_rects' must cover every pixel drawn on the display after the tilemap.
+        """
+        if self.revision != self.tilemap.revision:
+            self.revision = self.tilemap.revision
+            self.blocks = {}
+        view = display.get_rect()
+        if self.layer is None or self.layer.get_size() != view.size:
+            self.layer = pygame.Surface(view.size, pygame.SRCALPHA)
+        layer = self.layer
+        layer.fill((0, 0, 0, 0))
+
+        blits = []
+        for bx in range(offset[0] // BLOCK_SIZE, (offset[0] + view.width - 1) // BLOCK_SIZE + 1):
+            for by in range(offset[1] // BLOCK_SIZE, (offset[1] + view.height - 1) // BLOCK_SIZE + 1):
+                shadow = self.block_shadow(bx, by)
+                if shadow:
+                    blits.append((shadow, (bx * BLOCK_SIZE - offset[0] - 1, by * BLOCK_SIZE - offset[1] - 1)))
+        layer.blits(blits, doreturn=False)
+
+        """Anything within a pixel of a moving sprite, or on the view border, is rebuilt from the display"""
+        regions = []
+        for rect in dynamic_rects:
+            rect = rect.inflate(2, 2).clip(view)
+            if rect.width and rect.height:
+                for i, region in enumerate(regions):
+                    if region.colliderect(rect):
+                        regions[i] = region.union(rect)
+                        break
+                else:
+                    regions.append(rect)
+        regions += [pygame.Rect(0, 0, view.width, 1), pygame.Rect(0, view.height - 1, view.width, 1),
+                    pygame.Rect(0, 0, 1, view.height), pygame.Rect(view.width - 1, 0, 1, view.height)]
+
+        for region in regions:
+            source = region.inflate(2, 2).clip(view)
+            mask = pygame.mask.from_surface(display.subsurface(source))
+            silhouette = mask.to_surface(setcolor=SHADOW_COLOR, unsetcolor=(0, 0, 0, 0))
+            layer.fill((0, 0, 0, 0), region)
+            layer.set_clip(region)
+            for shift in SHADOW_OFFSETS:
+                layer.blit(silhouette, (source.x + shift[0], source.y + shift[1]))
+            layer.set_clip(None)
+
+        target.blit(layer, (0, 0))
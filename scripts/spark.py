@@ -2,33 +2,74 @@ import math
 import pygame
 
 
-class Spark:
-    """Create and manage spark effects"""
-    def __init__(self, pos, angle, speed):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
+class SparkSystem:
+    """Create and manage spark effects as a pool of reusable slots.
+
+    Each spark's direction never changes, so its cosine and sine are stored once when it is added.
+    Live sparks occupy the first 'count' slots; a dead spark is replaced by the last live one and its
+    slot is reused by the next spark that is added.
+    """
+
+    def __init__(self):
+        self.x = []
+        self.y = []
+        self.cos = []
+        self.sin = []
+        self.speed = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, pos, angle, speed):
+        i = self.count
+        if i == len(self.x):
+            self.x.append(0)
+            self.y.append(0)
+            self.cos.append(0)
+            self.sin.append(0)
+            self.speed.append(0)
+        self.x[i] = pos[0]
+        self.y[i] = pos[1]
+        self.cos[i] = math.cos(angle)
+        self.sin[i] = math.sin(angle)
+        self.speed[i] = speed
+        self.count += 1
 
     def update(self):
-        """Updates the spark's position based on its angle and speed"""
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
+        """Updates every spark's position based on its angle and speed.
+
+        Sparks that stopped on the previous update are recycled first, so each one is still drawn once
+        after it stops.
+        """
+        x, y, cos, sin, speed = self.x, self.y, self.cos, self.sin, self.speed
+        i = self.count - 1
+        while i >= 0:
+            if not speed[i]:
+                last = self.count - 1
+                x[i], y[i], cos[i], sin[i], speed[i] = x[last], y[last], cos[last], sin[last], speed[last]
+                self.count = last
+            i -= 1
 
-        self.speed = max(0, self.speed - 0.1)
-        return not self.speed
+        for i in range(self.count):
+            x[i] += cos[i] * speed[i]
+            y[i] += sin[i] * speed[i]
+            speed[i] = max(0, speed[i] - 0.1)
 
     def render(self, surf, offset=(0, 0)):
-        """Draws the spark on a given surface('surf')"""
-        render_points = [
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi * 0.5) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-
-        ]
-
-        pygame.draw.polygon(surf, (255, 255, 255), render_points)
+        """Draws every spark on a given surface('surf') and returns the rects drawn on"""
+        polygon = pygame.draw.polygon
+        rects = []
+        for px, py, c, s, speed in zip(self.x, self.y, self.cos, self.sin, self.speed[:self.count]):
+            px -= offset[0]
+            py -= offset[1]
+            long_x = c * speed * 3
+            long_y = s * speed * 3
+            rects.append(polygon(surf, (255, 255, 255), ((px + long_x, py + long_y),
+                                                         (px - s * speed * 3, py + c * speed * 0.5),
+                                                         (px - long_x, py - long_y),
+                                                         (px + s * speed * 3, py - c * speed * 0.5))))
+        return rects
@@ -0,0 +1,185 @@
+"""Uniform-grid spatial hashing used to find nearby objects without scanning every one of them."""
+
+
+class SpatialHash:
+    """Buckets hashable items by the grid cells their bounding rects overlap.
+
+    Rects are (x, y, width, height) tuples or pygame Rects and may use float coordinates. Queries
+    return every stored item whose rect overlaps the query area.
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.rects = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, item):
+        return item in self.rects
+
+    def cell_range(self, rect):
+        """Returns the inclusive range of cells (x0, y0, x1, y1) covered by a rect."""
+        size = self.cell_size
+        return (int(rect[0] // size), int(rect[1] // size),
+                int((rect[0] + max(rect[2], 1) - 1) // size), int((rect[1] + max(rect[3], 1) - 1) // size))
+
+    def insert(self, item, rect):
+        """Adds an item, or moves it if it is already stored."""
+        if item in self.rects:
+            self.remove(item)
+        rect = (rect[0], rect[1], rect[2], rect[3])
+        self.rects[item] = rect
+        x0, y0, x1, y1 = self.cell_range(rect)
+        cells = self.cells
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                bucket = cells.get((x, y))
+                if bucket is None:
+                    cells[(x, y)] = [item]
+                else:
+                    bucket.append(item)
+
+    def remove(self, item):
+        """Removes an item, touching only the cells it occupies."""
+        rect = self.rects.pop(item)
+        x0, y0, x1, y1 = self.cell_range(rect)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                bucket = self.cells[(x, y)]
+                bucket.remove(item)
+                if not bucket:
+                    del self.cells[(x, y)]
+
+    def clear(self):
+        self.cells = {}
+        self.rects = {}
+
+    def query_rect(self, rect):
+        """Returns the set of items whose rects overlap the given rect."""
+        found = set()
+        x0, y0, x1, y1 = self.cell_range(rect)
+        right = rect[0] + rect[2]
+        bottom = rect[1] + rect[3]
+        rects = self.rects
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                for item in self.cells.get((x, y), ()):
+                    if item not in found:
+                        r = rects[item]
+                        if r[0] < right and r[0] + r[2] > rect[0] and r[1] < bottom and r[1] + r[3] > rect[1]:
+                            found.add(item)
+        return found
+
+    def query_point(self, pos):
+        """Returns the set of items whose rects contain the given point."""
+        found = set()
+        rects = self.rects
+        for item in self.cells.get((int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)), ()):
+            r = rects[item]
+            if r[0] <= pos[0] < r[0] + r[2] and r[1] <= pos[1] < r[1] + r[3]:
+                found.add(item)
+        return found
+
+    def query_radius(self, pos, radius):
+        """Returns the set of items whose rects come within radius of a point."""
+        found = self.query_rect((pos[0] - radius, pos[1] - radius, radius * 2, radius * 2))
+        rects = self.rects
+        radius_sq = radius * radius
+        near = set()
+        for item in found:
+            r = rects[item]
+            dx = pos[0] - min(max(pos[0], r[0]), r[0] + r[2])
+            dy = pos[1] - min(max(pos[1], r[1]), r[1] + r[3])
+            if dx * dx + dy * dy <= radius_sq:
+                near.add(item)
+        return near
+
+
+class EntityGrid(SpatialHash):
+    """Broad phase over moving entities, rebuilt from their rects at most once per tick.
+
+    track() hands over the entity list after they have moved; the grid is rebuilt from it on the first
+    query that follows, so ticks in which nothing asks cost nothing. Entities are stored by identity and
+    queries return them in the order they were added, so effects triggered from the results don't depend
+    on set ordering.
+    """
+
+    def __init__(self, cell_size=32):
+        super().__init__(cell_size)
+        self.order = {}
+        self.next_order = 0
+        self.tracked = None
+
+    def __len__(self):
+        self.refresh()
+        return super().__len__()
+
+    def __contains__(self, item):
+        self.refresh()
+        return super().__contains__(item)
+
+    def track(self, entities):
+        """Marks the grid stale; it is rebuilt from these entities when next queried."""
+        self.tracked = entities
+
+    def refresh(self):
+        if self.tracked is not None:
+            self.rebuild(self.tracked)
+
+    def rebuild(self, entities):
+        """Replaces the contents with the current rects of the given entities."""
+        size = self.cell_size
+        cells = {}
+        rects = {}
+        order = {}
+        for i, entity in enumerate(entities):
+            """Entity rects are integer pygame Rects with a non-zero size, so skip cell_range's conversions.
+            Entities reuse their Rect, so store its values"""
+            x, y, w, h = entity.rect()
+            rects[entity] = (x, y, w, h)
+            order[entity] = i
+            for cx in range(x // size, (x + w - 1) // size + 1):
+                for cy in range(y // size, (y + h - 1) // size + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket is None:
+                        cells[(cx, cy)] = [entity]
+                    else:
+                        bucket.append(entity)
+        self.cells = cells
+        self.rects = rects
+        self.order = order
+        self.next_order = len(order)
+        self.tracked = None
+
+    def insert(self, item, rect):
+        """Adds an entity, or moves it while keeping its place in the order."""
+        self.refresh()
+        order = self.order.pop(item, None)
+        super().insert(item, rect)
+        if order is None:
+            order = self.next_order
+            self.next_order += 1
+        self.order[item] = order
+
+    def remove(self, item):
+        self.refresh()
+        super().remove(item)
+        self.order.pop(item, None)
+
+    def clear(self):
+        super().clear()
+        self.order = {}
+        self.next_order = 0
+        self.tracked = None
+
+    def in_rect(self, rect):
+        """Returns the entities overlapping a rect, in insertion order."""
+        self.refresh()
+        return sorted(self.query_rect(rect), key=self.order.__getitem__)
+
+    def near(self, pos, radius):
+        """Returns the entities within radius of a point, in insertion order."""
+        self.refresh()
+        return sorted(self.query_radius(pos, radius), key=self.order.__getitem__)
@@ -0,0 +1,193 @@
+"""Streams the chunks of large binary maps in and out around the camera"""
+import os
+from array import array
+from collections import OrderedDict
+
+from scripts import mapformat
+from scripts.tilemap import Tilemap, TileChunk, CHUNK_SIZE, read_map
+
+STREAM_RADIUS = 1
+STREAM_MEMORY_BUDGET = 32 * 1024 * 1024
+CHUNK_COST = 3 * CHUNK_SIZE * CHUNK_SIZE + 256
+OFFGRID_TILE_COST = 512
+
+
+def open_map(path):
+    """Like read_map, but a binary map is only opened (see MapFile) so StreamingTilemap can stream it."""
+    if os.path.splitext(path)[1] == mapformat.BINARY_EXTENSION:
+        return mapformat.MapFile(path)
+    return read_map(path)
+
+
+class StreamingTilemap(Tilemap):
+    """Tilemap that keeps only the chunks of a binary map near the camera in memory.
+
+    load_data() with a MapFile (see open_map) opens the level without loading any chunk. stream() then
+    makes every chunk within 'radius' chunks of the given rects resident and, once the resident chunks cost
+    more than 'memory_budget' bytes (baked surfaces included), unloads the ones that were needed least
+    recently. on_load(key) runs after a chunk is streamed in and on_unload(key) before it is dropped, so the
+    game can activate and park what lives there. Chunks whose tiles were changed while resident are kept
+    as edited when they are unloaded, so extracted spawners don't come back.
+
+    Any other map data (JSON, or a binary map read whole) is loaded as a plain Tilemap and stream() does
+    nothing.
+    """
+
+    def __init__(self, game, tile_size=16, radius=STREAM_RADIUS, memory_budget=STREAM_MEMORY_BUDGET):
+        self.map_file = None
+        super().__init__(game, tile_size)
+        self.radius = radius
+        self.memory_budget = memory_budget
+        self.on_load = None
+        self.on_unload = None
+        self.reset_stream()
+
+    @property
+    def streaming(self):
+        return self.map_file is not None
+
+    def reset_stream(self):
+        self.resident = OrderedDict()
+        self.offgrid_by_chunk = {}
+        self.dirty = set()
+        self.edited = {}
+        self.edited_offgrid = {}
+        self.last_ranges = None
+        self.type_table = None
+
+    def load_data(self, map_data):
+        if self.map_file is not None:
+            self.map_file.close()
+            self.map_file = None
+        self.reset_stream()
+        if not isinstance(map_data, mapformat.MapFile):
+            super().load_data(map_data)
+            return
+        if map_data.chunk_size != CHUNK_SIZE:
+            super().load_data(map_data.read_all())
+            map_data.close()
+            return
+
+        self.map_file = map_data
+        self.tile_size = map_data.tile_size
+        self.chunks = {}
+        self.tile_count = 0
+        self.offgrid_tiles = []
+        self.type_table = bytearray(range(256))
+        for i, tile_type in enumerate(map_data.palette):
+            self.type_table[i + 1] = self.type_id(tile_type)
+
+    def set_tile(self, x, y, tile_type, variant=0):
+        super().set_tile(x, y, tile_type, variant)
+        if self.map_file is not None:
+            self.dirty.add((x // CHUNK_SIZE, y // CHUNK_SIZE))
+
+    def remove_tile(self, x, y):
+        removed = super().remove_tile(x, y)
+        if removed and self.map_file is not None:
+            self.dirty.add((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        return removed
+
+    def chunk_range(self, rect):
+        chunk_px = CHUNK_SIZE * self.tile_size
+        return (int(rect[0] // chunk_px) - self.radius, int(rect[1] // chunk_px) - self.radius,
+                int((rect[0] + rect[2]) // chunk_px) + self.radius, int((rect[1] + rect[3]) // chunk_px) + self.radius)
+
+    def stream(self, rects):
+        """Makes the chunks around the given world rects (camera view, player) resident."""
+        if self.map_file is None:
+            return
+        ranges = tuple(self.chunk_range(rect) for rect in rects)
+        if ranges == self.last_ranges:
+            return
+        self.last_ranges = ranges
+
+        needed = set()
+        for left, top, right, bottom in ranges:
+            for cy in range(top, bottom + 1):
+                for cx in range(left, right + 1):
+                    needed.add((cx, cy))
+        for key in sorted(needed, key=lambda key: (key[1], key[0])):
+            if key in self.resident:
+                self.resident.move_to_end(key)
+            else:
+                self.load_chunk(key)
+        self.evict(needed)
+
+    def is_resident(self, pos):
+        """Checks that the chunk around a world position and its side and lower neighbours are loaded."""
+        if self.map_file is None:
+            return True
+        chunk_px = CHUNK_SIZE * self.tile_size
+        cx, cy = int(pos[0] // chunk_px), int(pos[1] // chunk_px)
+        resident = self.resident
+        return (cx, cy) in resident and (cx - 1, cy) in resident and (cx + 1, cy) in resident \
+            and (cx, cy + 1) in resident
+
+    def load_chunk(self, key):
+        if key in self.edited:
+            chunk = self.edited.pop(key)
+        else:
+            chunk = None
+            data = self.map_file.chunk(key)
+            if data is not None:
+                chunk = TileChunk()
+                chunk.types = array('B', data[0].translate(self.type_table))
+                chunk.variants = array('H')
+                chunk.variants.frombytes(data[1])
+                chunk.count = CHUNK_SIZE * CHUNK_SIZE - chunk.types.count(0)
+        if chunk is not None and chunk.count:
+            self.chunks[key] = chunk
+            self.tile_count += chunk.count
+
+        tiles = self.edited_offgrid.pop(key) if key in self.edited_offgrid else self.map_file.offgrid(key)
+        for order, tile in tiles:
+            self.offgrid_tiles.append(tile, order)
+        self.offgrid_by_chunk[key] = [tile for order, tile in tiles]
+
+        self.resident[key] = True
+        self.touch()
+        if self.on_load:
+            self.on_load(key)
+
+    def unload_chunk(self, key):
+        if self.on_unload:
+            self.on_unload(key)
+        chunk = self.chunks.pop(key, None)
+        if chunk is not None:
+            self.tile_count -= chunk.count
+            chunk.surf = None
+        if key in self.dirty:
+            self.dirty.discard(key)
+            self.edited[key] = chunk
+
+        layer = self.offgrid_tiles
+        tiles = self.offgrid_by_chunk.pop(key, [])
+        kept = [(layer.order[id(tile)], tile) for tile in tiles if id(tile) in layer.tiles]
+        if len(kept) != len(tiles):
+            self.edited_offgrid[key] = kept
+        for order, tile in kept:
+            layer.remove(tile)
+
+        del self.resident[key]
+        self.touch()
+
+    def chunk_cost(self, key):
+        cost = CHUNK_COST + OFFGRID_TILE_COST * len(self.offgrid_by_chunk.get(key, ()))
+        chunk = self.chunks.get(key)
+        if chunk is not None and chunk.surf is not None:
+            cost += chunk.surf.get_width() * chunk.surf.get_height() * 4
+        return cost
+
+    def resident_bytes(self):
+        return sum(self.chunk_cost(key) for key in self.resident)
+
+    def evict(self, needed):
+        """Unloads the least recently needed chunks until the resident ones fit the memory budget."""
+        total = self.resident_bytes()
+        for key in list(self.resident):
+            if total <= self.memory_budget:
+                break
+            if key not in needed:
+                total -= self.chunk_cost(key)
+                self.unload_chunk(key)
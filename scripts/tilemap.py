@@ -1,7 +1,18 @@
 """designed to handle various aspects of a tile-based map system."""
-import pygame
+import sys
+import math
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import os
 import json
 
+import pygame
+
+from scripts.spatial import SpatialHash
+from scripts import mapformat
+
 AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (0, 1)])): 0,
     tuple(sorted([(1, 0), (0, 1), (-1, 0)])): 1,
@@ -18,34 +29,437 @@ NEIGHBOR_OFFSETS = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (0, 0), (-1, 1)
 PHYSICS_TILES = {'grass', 'stone'}
 AUTOTILE_TYPES = {'grass', 'stone'}
 
+"""Neighbour bitmask -> variant: bit n is set when the tile at AUTOTILE_SHIFTS[n] has the same type"""
+AUTOTILE_SHIFTS = [(1, 0), (-1, 0), (0, -1), (0, 1)]
+AUTOTILE_VARIANTS = [AUTOTILE_MAP.get(tuple(sorted(shift for bit, shift in enumerate(AUTOTILE_SHIFTS)
+                                                  if mask >> bit & 1))) for mask in range(16)]
+"""Byte table for the bulk pass: 16 + mask -> variant, anything else -> AUTOTILE_KEEP"""
+AUTOTILE_KEEP = 255
+AUTOTILE_TABLE = bytes([AUTOTILE_KEEP] * 16 + [AUTOTILE_KEEP if variant is None else variant
+                                                for variant in AUTOTILE_VARIANTS] + [AUTOTILE_KEEP] * 224)
+AUTOTILE_WRITE = bytes(0 if variant == AUTOTILE_KEEP else 255 for variant in range(256))
+
+CHUNK_SIZE = 16
+OFFGRID_CELL_SIZE = 64
+"""Baked chunk surfaces kept at most; the least recently drawn ones are dropped beyond that"""
+MAX_BAKED_CHUNKS = 64
+
+
+def read_map(path):
+    """Reads and parses a map file (JSON or binary, see mapformat) without touching any tilemap, so it can
+    run on a loader thread."""
+    if os.path.splitext(path)[1] == mapformat.BINARY_EXTENSION:
+        return mapformat.read(path)
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class TileChunk:
+    """A CHUNK_SIZE x CHUNK_SIZE block of on-grid tiles stored as packed type and variant IDs.
+
+    Type IDs index into the owning Tilemap's palette, offset by one so that 0 means an empty cell.
+    'surf' caches the chunk's tiles pre-rendered onto one surface and is dropped whenever a tile changes.
+    'solid' caches the chunk's solidity bitmap (see Tilemap.solid_rows) and is dropped when a tile is placed
+    or removed.
+    """
+    __slots__ = ('types', 'variants', 'count', 'surf', 'solid')
+
+    def __init__(self):
+        self.types = array('B', bytes(CHUNK_SIZE * CHUNK_SIZE))
+        self.variants = array('H', bytes(2 * CHUNK_SIZE * CHUNK_SIZE))
+        self.count = 0
+        self.surf = None
+        self.solid = None
+
+
+class TileGridView(MutableMapping):
+    """Dict-style view of a Tilemap's grid, keyed by the legacy 'x;y' strings.
+
+    Values are built on access, so changing a returned tile dict does not write back to the map;
+    assign the tile again (or use Tilemap.set_tile) instead.
+    """
+
+    def __init__(self, tilemap):
+        self._tilemap = tilemap
+
+    @staticmethod
+    def _parse(key):
+        x, y = key.split(';')
+        return int(x), int(y)
+
+    def __getitem__(self, key):
+        tile = self._tilemap.tile_at(*self._parse(key))
+        if tile is None:
+            raise KeyError(key)
+        return tile
+
+    def __setitem__(self, key, tile):
+        x, y = self._parse(key)
+        self._tilemap.set_tile(x, y, tile['type'], tile['variant'])
+
+    def __delitem__(self, key):
+        if not self._tilemap.remove_tile(*self._parse(key)):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            return self._tilemap.tile_type_at(*self._parse(key)) is not None
+        except (AttributeError, ValueError):
+            return False
+
+    def __iter__(self):
+        for x, y in self._tilemap.tile_positions():
+            yield str(x) + ';' + str(y)
+
+    def __len__(self):
+        return self._tilemap.tile_count
+
+    def to_dict(self):
+        """Returns a plain dict copy in the JSON map layout."""
+        return {key: self[key] for key in self}
+
+
+class OffgridLayer:
+    """Ordered collection of off-grid tiles with a spatial index over their image rects.
+
+    Supports the list operations the game and editor use (append, remove, iteration, copy) while
+    viewport queries, point picking and removal only touch the tiles near the area in question.
+    Tiles are tracked by identity, so remove() expects the same dict that was added.
+    """
+
+    def __init__(self, size_of, tiles=(), on_change=None):
+        self.size_of = size_of
+        self.on_change = on_change
+        self.index = SpatialHash(OFFGRID_CELL_SIZE)
+        self.tiles = {}
+        self.order = {}
+        self.next_order = 0
+        self.drawn = None
+        for tile in tiles:
+            self.append(tile)
+
+    def __iter__(self):
+        return iter(self.in_order())
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __getitem__(self, i):
+        return self.in_order()[i]
+
+    def copy(self):
+        """Returns the tiles as a list in drawing order, which is also the order they are saved in."""
+        return list(self.in_order())
+
+    def in_order(self):
+        """Returns the tiles in drawing order. The list is cached until the layer changes and replaced rather
+        than modified then, so it is safe to iterate while adding or removing tiles; don't modify it.
+        """
+        if self.drawn is None:
+            self.drawn = self._sorted(self.tiles)
+        return self.drawn
+
+    def append(self, tile, order=None):
+        """Adds a tile on top of the others, or at a given draw order (used when streaming tiles back in)."""
+        key = id(tile)
+        if order is None:
+            order = self.next_order
+        self.tiles[key] = tile
+        self.order[key] = order
+        self.next_order = max(self.next_order, order + 1)
+        size = self.size_of(tile)
+        self.index.insert(key, (tile['pos'][0], tile['pos'][1], size[0], size[1]))
+        self.drawn = None
+        if self.on_change:
+            self.on_change()
+
+    def remove(self, tile):
+        key = id(tile)
+        if key not in self.tiles:
+            raise ValueError('tile is not in the off-grid layer')
+        del self.tiles[key]
+        del self.order[key]
+        self.index.remove(key)
+        self.drawn = None
+        if self.on_change:
+            self.on_change()
+
+    def _sorted(self, keys):
+        return [self.tiles[key] for key in sorted(keys, key=self.order.__getitem__)]
+
+    def query_rect(self, rect):
+        """Returns the tiles whose images overlap a rect, in drawing order."""
+        return self._sorted(self.index.query_rect(rect))
+
+    def query_point(self, pos):
+        """Returns the tiles whose images contain a point, in drawing order."""
+        return self._sorted(self.index.query_point(pos))
+
 
 class Tilemap:
     def __init__(self, game, tile_size=16):
         self.game = game
         self.tile_size = tile_size
-        self.tilemap = {}
+        self.chunks = {}
+        self.tile_count = 0
+        self.revision = 0
+        self.palette = []
+        self.palette_ids = {}
+        self.solid_ids = bytearray(1)
+        self.baked = OrderedDict()
         self.offgrid_tiles = []
 
-    def extract(self, id_pairs, keep=False):
-        """Extracts specific tiles based on given criteria."""
-        matches = []
-        keys_to_remove = []
+    @property
+    def offgrid_tiles(self):
+        return self._offgrid
 
-        for loc, tile in self.tilemap.items():
-            if (tile['type'], tile['variant']) in id_pairs:
-                match = tile.copy()
-                match['pos'] = match['pos'].copy()
-                match['pos'][0] *= self.tile_size
-                match['pos'][1] *= self.tile_size
-                matches.append(match)
+    @offgrid_tiles.setter
+    def offgrid_tiles(self, tiles):
+        self._offgrid = OffgridLayer(self.offgrid_size, tiles, on_change=self.touch)
+        self.touch()
 
-                if not keep:
-                    keys_to_remove.append(loc)
+    def touch(self):
+        """Bumps the revision counter that render caches outside the tilemap use to spot edits."""
+        self.revision += 1
+
+    def offgrid_size(self, tile):
+        """Returns the image size of an off-grid tile, falling back to one grid cell without assets."""
+        assets = getattr(self.game, 'assets', None)
+        if assets and tile['type'] in assets:
+            return assets[tile['type']][tile['variant']].get_size()
+        return self.tile_size, self.tile_size
+
+    def offgrid_at(self, pos):
+        """Returns the off-grid tiles whose images contain a world position."""
+        return self.offgrid_tiles.query_point(pos)
+
+    @property
+    def tilemap(self):
+        """Compatibility view of the grid in the old {'x;y': tile} layout."""
+        return TileGridView(self)
+
+    @tilemap.setter
+    def tilemap(self, tiles):
+        """Replaces the grid, writing the tiles straight into the chunk buffers (set_tile is for edits).
+
+        Cells are read from the tiles' 'pos', which the JSON maps keep equal to their 'x;y' keys and which
+        is about twice as fast to use as parsing the keys.
+        """
+        self.chunks = chunks = {}
+        self.touch()
+        palette_ids = self.palette_ids
+        for tile in tiles.values():
+            x, y = tile['pos']
+            key = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+            chunk = chunks.get(key)
+            if chunk is None:
+                chunk = chunks[key] = TileChunk()
+            type_id = palette_ids.get(tile['type']) or self.type_id(tile['type'])
+            i = (y % CHUNK_SIZE) * CHUNK_SIZE + x % CHUNK_SIZE
+            if not chunk.types[i]:
+                chunk.count += 1
+            chunk.types[i] = type_id
+            chunk.variants[i] = tile['variant']
+        self.tile_count = sum(chunk.count for chunk in chunks.values())
+
+    def type_id(self, tile_type):
+        """Returns the palette ID for a tile type, registering the type if it is new."""
+        type_id = self.palette_ids.get(tile_type)
+        if type_id is None:
+            self.palette.append(tile_type)
+            type_id = len(self.palette)
+            self.palette_ids[tile_type] = type_id
+            self.solid_ids.append(tile_type in PHYSICS_TILES)
+        return type_id
+
+    def set_tile(self, x, y, tile_type, variant=0):
+        """Places a tile at integer grid coordinates, replacing whatever was there."""
+        key = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = TileChunk()
+        i = (y % CHUNK_SIZE) * CHUNK_SIZE + x % CHUNK_SIZE
+        type_id = self.type_id(tile_type)
+        if chunk.types[i] == type_id and chunk.variants[i] == variant:
+            return
+        if not chunk.types[i]:
+            chunk.count += 1
+            self.tile_count += 1
+        chunk.types[i] = type_id
+        chunk.variants[i] = variant
+        chunk.surf = None
+        chunk.solid = None
+        self.revision += 1
+
+    def remove_tile(self, x, y):
+        """Removes the tile at integer grid coordinates. Returns False if the cell was already empty."""
+        key = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return False
+        i = (y % CHUNK_SIZE) * CHUNK_SIZE + x % CHUNK_SIZE
+        if not chunk.types[i]:
+            return False
+        chunk.types[i] = 0
+        chunk.variants[i] = 0
+        chunk.count -= 1
+        chunk.surf = None
+        chunk.solid = None
+        self.tile_count -= 1
+        self.revision += 1
+        if not chunk.count:
+            del self.chunks[key]
+        return True
+
+    def tile_type_at(self, x, y):
+        """Returns the tile type name at integer grid coordinates, or None for an empty cell."""
+        chunk = self.chunks.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        if chunk is not None:
+            type_id = chunk.types[(y % CHUNK_SIZE) * CHUNK_SIZE + x % CHUNK_SIZE]
+            if type_id:
+                return self.palette[type_id - 1]
+        return None
+
+    def tile_at(self, x, y):
+        """Returns the tile at integer grid coordinates as a {'type', 'variant', 'pos'} dict, or None."""
+        chunk = self.chunks.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        if chunk is not None:
+            i = (y % CHUNK_SIZE) * CHUNK_SIZE + x % CHUNK_SIZE
+            type_id = chunk.types[i]
+            if type_id:
+                return {'type': self.palette[type_id - 1], 'variant': chunk.variants[i], 'pos': [x, y]}
+        return None
+
+    def solid_at(self, x, y):
+        """Checks whether the tile at integer grid coordinates is a physics tile."""
+        chunk = self.chunks.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        if chunk is None:
+            return False
+        return self.solid_ids[chunk.types[(y % CHUNK_SIZE) * CHUNK_SIZE + x % CHUNK_SIZE]] == 1
+
+    def solid_rows(self, key):
+        """Returns the solidity bitmap of a chunk as CHUNK_SIZE row masks (bit x set for a physics tile in column
+        x of the row), or None when the chunk is empty. The bitmap is rebuilt after a tile was placed or removed.
+        """
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return None
+        if chunk.solid is None:
+            digits = bytes(b'01'[solid] for solid in self.solid_ids).ljust(256, b'0')
+            cells = chunk.types.tobytes().translate(digits)
+            chunk.solid = [int(cells[row * CHUNK_SIZE:(row + 1) * CHUNK_SIZE][::-1], 2) for row in range(CHUNK_SIZE)]
+        return chunk.solid
+
+    def solid_points(self, points):
+        """Checks many world positions at once; returns a list with True for each one inside a physics tile."""
+        size = self.tile_size
+        result = []
+        last_key = rows = None
+        for px, py in points:
+            x = int(px // size)
+            y = int(py // size)
+            key = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+            if key != last_key:
+                last_key = key
+                rows = self.solid_rows(key)
+            result.append(rows is not None and rows[y % CHUNK_SIZE] >> x % CHUNK_SIZE & 1 == 1)
+        return result
+
+    def solid_in_row(self, y, x0, x1):
+        """Returns the first column from x0 towards x1 (both included) of grid row y that holds a physics tile,
+        or None. Whole chunk rows are tested at once with their bitmaps.
+        """
+        step = 1 if x1 >= x0 else -1
+        low, high = min(x0, x1), max(x0, x1)
+        cy, row = divmod(y, CHUNK_SIZE)
+        for cx in range(x0 // CHUNK_SIZE, x1 // CHUNK_SIZE + step, step):
+            rows = self.solid_rows((cx, cy))
+            if rows is None or not rows[row]:
+                continue
+            base = cx * CHUNK_SIZE
+            first = max(low - base, 0)
+            last = min(high - base, CHUNK_SIZE - 1)
+            hits = rows[row] & ((1 << last + 1) - (1 << first))
+            if hits:
+                return base + ((hits & -hits).bit_length() - 1 if step > 0 else hits.bit_length() - 1)
+        return None
+
+    def raycast(self, start, end):
+        """Returns the grid coordinates of the first physics tile on the segment between two world positions,
+        or None when the segment is clear. Walks the grid cell by cell along the segment; segments within one
+        grid row are tested with solid_in_row.
+        """
+        size = self.tile_size
+        x, y = int(start[0] // size), int(start[1] // size)
+        end_x, end_y = int(end[0] // size), int(end[1] // size)
+        if y == end_y:
+            column = self.solid_in_row(y, x, end_x)
+            return None if column is None else (column, y)
+
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        """Distances along the segment (0 to 1) to the next column and row boundary, and between boundaries"""
+        next_x = ((x + (step_x > 0)) * size - start[0]) / dx if dx else math.inf
+        next_y = ((y + (step_y > 0)) * size - start[1]) / dy
+        delta_x = size / abs(dx) if dx else math.inf
+        delta_y = size / abs(dy)
+        for i in range(abs(end_x - x) + abs(end_y - y)):
+            if self.solid_at(x, y):
+                return x, y
+            if next_x < next_y:
+                next_x += delta_x
+                x += step_x
+            else:
+                next_y += delta_y
+                y += step_y
+        return (x, y) if self.solid_at(x, y) else None
+
+    def line_of_sight(self, start, end):
+        """Checks that no physics tile lies between two world positions."""
+        return self.raycast(start, end) is None
 
-        for loc in keys_to_remove:
-            del self.tilemap[loc]
+    def tile_positions(self):
+        """Yields the grid coordinates of every placed tile."""
+        for (cx, cy), chunk in list(self.chunks.items()):
+            types = chunk.types
+            for i in range(CHUNK_SIZE * CHUNK_SIZE):
+                if types[i]:
+                    yield cx * CHUNK_SIZE + i % CHUNK_SIZE, cy * CHUNK_SIZE + i // CHUNK_SIZE
 
-        for tile in self.offgrid_tiles.copy():
+    def chunk_offgrid(self, key):
+        """Returns the off-grid tiles whose positions lie in one chunk, in drawing order."""
+        chunk_px = CHUNK_SIZE * self.tile_size
+        area = (key[0] * chunk_px, key[1] * chunk_px, chunk_px, chunk_px)
+        return [tile for tile in self.offgrid_tiles.query_rect(area)
+                if mapformat.offgrid_chunk(tile, chunk_px) == key]
+
+    def extract(self, id_pairs, keep=False, chunk=None):
+        """Extracts specific tiles based on given criteria; 'chunk' limits the search to one chunk key."""
+        matches = []
+        cells_to_remove = []
+
+        """Compare packed IDs and only build tile dicts for the matches"""
+        wanted = {(self.palette_ids[tile_type], variant) for tile_type, variant in id_pairs
+                  if tile_type in self.palette_ids}
+        wanted_types = {type_id for type_id, variant in wanted}
+        keys = list(self.chunks) if chunk is None else [chunk] if chunk in self.chunks else []
+        for cx, cy in keys:
+            grid_chunk = self.chunks[(cx, cy)]
+            types, variants = grid_chunk.types, grid_chunk.variants
+            for i in range(CHUNK_SIZE * CHUNK_SIZE):
+                type_id = types[i]
+                if type_id in wanted_types and (type_id, variants[i]) in wanted:
+                    x, y = cx * CHUNK_SIZE + i % CHUNK_SIZE, cy * CHUNK_SIZE + i // CHUNK_SIZE
+                    matches.append({'type': self.palette[type_id - 1], 'variant': variants[i],
+                                    'pos': [x * self.tile_size, y * self.tile_size]})
+                    if not keep:
+                        cells_to_remove.append((x, y))
+
+        for x, y in cells_to_remove:
+            self.remove_tile(x, y)
+
+        for tile in self.offgrid_tiles.copy() if chunk is None else self.chunk_offgrid(chunk):
             if (tile['type'], tile['variant']) in id_pairs:
                 matches.append(tile.copy())
                 if not keep:
@@ -58,76 +472,217 @@ class Tilemap:
         tiles = []
         tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
         for offset in NEIGHBOR_OFFSETS:
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
-            if check_loc in self.tilemap:
-                tiles.append(self.tilemap[check_loc])
+            tile = self.tile_at(tile_loc[0] + offset[0], tile_loc[1] + offset[1])
+            if tile is not None:
+                tiles.append(tile)
         return tiles
 
-    def save(self, path):
-        """Methods to save the current tilemap to a file"""
+    def save(self, path, compress=False):
+        """Methods to save the current tilemap to a file; a '.map' path writes the binary format"""
+        if os.path.splitext(path)[1] == mapformat.BINARY_EXTENSION:
+            chunks = {key: (chunk.types, chunk.variants) for key, chunk in self.chunks.items()}
+            mapformat.write(path, self.tile_size, CHUNK_SIZE, self.palette, chunks, self.offgrid_tiles.copy(),
+                            compress=compress)
+            return
         f = open(path, 'w')
         json.dump({
-            'tilemap': self.tilemap,
+            'tilemap': self.tilemap.to_dict(),
             'tile_size': self.tile_size,
-            'offgrid': self.offgrid_tiles
+            'offgrid': self.offgrid_tiles.copy()
         }, f)
         f.close()
 
     def load(self, path):
-        """load a tilemap from a file, utilizing JSON for data storage"""
-        f = open(path, 'r')
-        map_data = json.load(f)
-        f.close()
+        """load a tilemap from a file, utilizing JSON (or the binary map format) for data storage"""
+        self.load_data(read_map(path))
 
-        self.tilemap = map_data['tilemap']
+    def load_data(self, map_data):
+        """Replaces the map with already parsed map data (see read_map)"""
         self.tile_size = map_data['tile_size']
+        if 'chunks' in map_data:
+            self.load_chunks(map_data['palette'], map_data['chunk_size'], map_data['chunks'])
+        else:
+            self.tilemap = map_data['tilemap']
         self.offgrid_tiles = map_data['offgrid']
 
+    def load_chunks(self, palette, chunk_size, chunks):
+        """Replaces the grid with packed chunks from a binary map, copying their bytes when the layout matches."""
+        self.chunks = {}
+        self.tile_count = 0
+        self.touch()
+        table = bytearray(range(256))
+        for i, tile_type in enumerate(palette):
+            table[i + 1] = self.type_id(tile_type)
+
+        cells = chunk_size * chunk_size
+        for (cx, cy), (types, variants) in chunks.items():
+            if chunk_size != CHUNK_SIZE:
+                variants = array('H', bytes(variants))
+                for i in range(cells):
+                    if types[i]:
+                        x, y = cx * chunk_size + i % chunk_size, cy * chunk_size + i // chunk_size
+                        self.set_tile(x, y, self.palette[table[types[i]] - 1], variants[i])
+                continue
+            chunk = TileChunk()
+            chunk.types = array('B', bytes(types).translate(table))
+            chunk.variants = array('H')
+            chunk.variants.frombytes(variants)
+            chunk.count = cells - chunk.types.count(0)
+            if chunk.count:
+                self.chunks[(cx, cy)] = chunk
+                self.tile_count += chunk.count
+
     def solid_check(self, pos):
         """Checks if a given position intersects with a 'solid' tile, used for physics or collision detection."""
-        tile_loc = str(int(pos[0] // self.tile_size))  + ';' + str(int(pos[1] // self.tile_size))
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
-                return self.tilemap[tile_loc]
+        tile_x = int(pos[0] // self.tile_size)
+        tile_y = int(pos[1] // self.tile_size)
+        if self.solid_at(tile_x, tile_y):
+            return self.tile_at(tile_x, tile_y)
 
     def physics_rects_around(self, pos):
         """Generates Pygame Rect objects for physics-enabled tiles around a given position"""
         rects = []
-        for tile in self.tiles_around(pos):
-            if tile['type'] in PHYSICS_TILES:
-                rects.append(
-                    pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size,
-                                self.tile_size))
+        tile_x = int(pos[0] // self.tile_size)
+        tile_y = int(pos[1] // self.tile_size)
+        for offset in NEIGHBOR_OFFSETS:
+            if self.solid_at(tile_x + offset[0], tile_y + offset[1]):
+                rects.append(pygame.Rect((tile_x + offset[0]) * self.tile_size, (tile_y + offset[1]) * self.tile_size,
+                                         self.tile_size, self.tile_size))
         return rects
 
     def autotile(self):
-        """Automatically adjusts tile variants based on neighboring tiles"""
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            for shift in [(1, 0), (-1, 0), (0, -1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]['type'] == tile['type']:
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbors]
+        """Automatically adjusts tile variants based on neighboring tiles, one chunk at a time"""
+        for key in list(self.chunks):
+            self.autotile_chunk(key)
+
+    def autotile_tile(self, x, y):
+        """Adjusts the variant of one tile from its four neighbours"""
+        tile_type = self.tile_type_at(x, y)
+        if tile_type not in AUTOTILE_TYPES:
+            return
+        mask = 0
+        for bit, shift in enumerate(AUTOTILE_SHIFTS):
+            if self.tile_type_at(x + shift[0], y + shift[1]) == tile_type:
+                mask |= 1 << bit
+        variant = AUTOTILE_VARIANTS[mask]
+        if variant is not None:
+            self.set_tile(x, y, tile_type, variant)
+
+    def autotile_around(self, x, y):
+        """Re-autotiles a placed or removed tile and the neighbours whose masks it is part of"""
+        self.autotile_tile(x, y)
+        for shift in AUTOTILE_SHIFTS:
+            self.autotile_tile(x + shift[0], y + shift[1])
+
+    def padded_types(self, key):
+        """Returns a chunk's type IDs with a one cell border from its neighbours, as (CHUNK_SIZE + 2)^2 bytes"""
+        cx, cy = key
+        size = CHUNK_SIZE
+        empty = bytes(size)
+        types = self.chunks[key].types.tobytes()
+        neighbours = [self.chunks.get((cx + dx, cy + dy)) for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1))]
+        left, right, above, below = [chunk.types.tobytes() if chunk else None for chunk in neighbours]
+        rows = [b'\0' + (above[-size:] if above else empty) + b'\0']
+        for y in range(size):
+            rows.append((left[y * size + size - 1:y * size + size] if left else b'\0')
+                        + types[y * size:(y + 1) * size]
+                        + (right[y * size:y * size + 1] if right else b'\0'))
+        rows.append(b'\0' + (below[:size] if below else empty) + b'\0')
+        return b''.join(rows)
+
+    def autotile_chunk(self, key):
+        """Autotiles a whole chunk with bytewise integer arithmetic instead of a lookup per neighbour.
+
+        Every type is turned into a 0/1 byte per cell of the padded chunk; shifting that integer by one cell
+        or one row lines each cell up with a neighbour, so OR-ing the shifted copies builds all the neighbour
+        masks at once. AUTOTILE_TABLE then maps the masks to variants with a single translate().
+        """
+        chunk = self.chunks[key]
+        width = CHUNK_SIZE + 2
+        padded = None
+        for type_id in [self.palette_ids[tile_type] for tile_type in AUTOTILE_TYPES if tile_type in self.palette_ids]:
+            if type_id not in chunk.types:
+                continue
+            if padded is None:
+                padded = self.padded_types(key)
+            same = bytearray(256)
+            same[type_id] = 1
+            cells = int.from_bytes(padded.translate(same), 'little')
+            masks = ((cells >> 8) | (cells << 9) | (cells << width * 8 + 2) | (cells >> width * 8 - 3)) \
+                & (cells * 15) | (cells << 4)
+            masks = masks.to_bytes(width * width + width + 1, 'little')
+            variants = b''.join(masks[y * width + 1:y * width + 1 + CHUNK_SIZE]
+                                for y in range(1, CHUNK_SIZE + 1)).translate(AUTOTILE_TABLE)
+
+            """Most chunks of an already autotiled map come out unchanged, so compare all variants at once first"""
+            current = chunk.variants
+            """Widened to 16 bits like TileChunk.variants; 257 * 0xff turns each write flag into a 0xffff lane"""
+            write = array('H', variants.translate(AUTOTILE_WRITE)).tobytes()
+            changed = (int.from_bytes(array('H', variants).tobytes(), sys.byteorder)
+                       ^ int.from_bytes(current.tobytes(), sys.byteorder)) \
+                & int.from_bytes(write, sys.byteorder) * 257
+            if not changed:
+                continue
+            x0, y0 = key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE
+            tile_type = self.palette[type_id - 1]
+            for i, variant in enumerate(variants):
+                if variant != AUTOTILE_KEEP and current[i] != variant:
+                    self.set_tile(x0 + i % CHUNK_SIZE, y0 + i // CHUNK_SIZE, tile_type, variant)
+
+    def bake_chunk(self, chunk):
+        """Pre-renders a chunk's tiles onto a single transparent surface.
+
+        The surface starts at the chunk's top-left corner and grows right and down to fit tile images that
+        are larger than a grid cell.
+        """
+        assets = self.game.assets
+        blits = []
+        width = height = CHUNK_SIZE * self.tile_size
+        for i in range(CHUNK_SIZE * CHUNK_SIZE):
+            type_id = chunk.types[i]
+            if type_id:
+                img = assets[self.palette[type_id - 1]][chunk.variants[i]]
+                pos = ((i % CHUNK_SIZE) * self.tile_size, (i // CHUNK_SIZE) * self.tile_size)
+                width = max(width, pos[0] + img.get_width())
+                height = max(height, pos[1] + img.get_height())
+                blits.append((img, pos))
+        """Blit column by column to keep the overlap order of the per-tile renderer"""
+        blits.sort(key=lambda blit: blit[1])
+        chunk.surf = pygame.Surface((width, height), pygame.SRCALPHA)
+        chunk.surf.blits(blits, doreturn=False)
+        return chunk.surf
 
     def render(self, surf, offset=(0, 0)):
-        for tile in self.offgrid_tiles:
-            surf.blit(self.game.assets[tile['type']][tile['variant']],
-                      (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y)
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    surf.blit(self.game.assets[tile['type']][tile['variant']],
-                             (tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
+        view = pygame.Rect(offset[0], offset[1], surf.get_width(), surf.get_height())
+        assets = self.game.assets
+
+        """Floor the world position so decor lands on the same pixel whatever the offset"""
+        surf.blits([(assets[tile['type']][tile['variant']],
+                     (math.floor(tile['pos'][0]) - offset[0], math.floor(tile['pos'][1]) - offset[1]))
+                    for tile in self.offgrid_tiles.query_rect(view)], doreturn=False)
+
+        chunk_px = CHUNK_SIZE * self.tile_size
+        blits = []
+        """Start one chunk early so tiles overhanging from the left/top neighbours are still drawn"""
+        for cx in range(view.x // chunk_px - 1, view.right // chunk_px + 1):
+            for cy in range(view.y // chunk_px - 1, view.bottom // chunk_px + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                chunk_surf = chunk.surf or self.bake_chunk(chunk)
+                self.baked[(cx, cy)] = True
+                self.baked.move_to_end((cx, cy))
+                if len(self.baked) > MAX_BAKED_CHUNKS:
+                    evicted = self.chunks.get(self.baked.popitem(last=False)[0])
+                    if evicted is not None:
+                        evicted.surf = None
+                pos = (cx * chunk_px - offset[0], cy * chunk_px - offset[1])
+                if pos[0] + chunk_surf.get_width() > 0 and pos[1] + chunk_surf.get_height() > 0:
+                    blits.append((chunk_surf, pos))
+        surf.blits(blits, doreturn=False)
 
     def clear(self):
         """Clears the current tilemap and off-grid tiles"""
-        self.tilemap = {}
+        self.chunks = {}
+        self.tile_count = 0
         self.offgrid_tiles = []
@@ -1,23 +1,16 @@
-import os
+import sys
 
-import pygame
-
-BASE_IMG_PATH = 'data/images/'
+from scripts.assets import get_registry
 
 
 def load_image(path):
     """Loads a single image from  specified path."""
-    img = pygame.image.load(BASE_IMG_PATH + path).convert()
-    img.set_colorkey((0, 0, 0))
-    return img
+    return get_registry().image(path)
 
 
 def load_images(path):
     """Loads all images from specified directory."""
-    images = []
-    for img_name in sorted(os.listdir(BASE_IMG_PATH + path)):
-        images.append(load_image(path + '/' + img_name))
-    return images
+    return get_registry().images_in(path)
 
 
 class Animation:
@@ -45,3 +38,59 @@ class Animation:
     def img(self):
         """Returns the current image of the animation """
         return self.images[int(self.frame / self.img_duration)]
+
+
+class SilentSound:
+    """Stands in for pygame.mixer.Sound when audio is disabled (headless runs)."""
+
+    def play(self, *args, **kwargs):
+        pass
+
+    def set_volume(self, volume):
+        pass
+
+
+class LazySound:
+    """Stands in for a pygame.mixer.Sound that is still loading in the background (see BackgroundLoader).
+
+    Volume changes are kept and applied once the sound is ready. A looping play requested before then
+    starts as soon as the sound finishes loading; one-shot effects that fire before that are skipped.
+    A sound that fails to load is reported on stderr and stays silent.
+    The sound is swapped in by the loader's poll() on the main thread, never on the loader thread.
+    """
+
+    def __init__(self, future, loader):
+        self.ready = None
+        self.volume = None
+        self.pending = None
+        loader.when_done(future, self.loaded)
+
+    def sound(self):
+        """Returns the loaded Sound, or None while it is still loading or if loading failed."""
+        return self.ready
+
+    def loaded(self, future):
+        if future.exception() is not None:
+            print(f'sound unavailable, playing silence: {future.exception()}', file=sys.stderr)
+            return
+        sound = self.ready = future.result()
+        if self.volume is not None:
+            sound.set_volume(self.volume)
+        if self.pending is not None:
+            args, kwargs = self.pending
+            self.pending = None
+            sound.play(*args, **kwargs)
+
+    def play(self, *args, **kwargs):
+        sound = self.ready
+        if sound is None:
+            loops = args[0] if args else kwargs.get('loops', 0)
+            if loops == -1:
+                self.pending = (args, kwargs)
+            return None
+        return sound.play(*args, **kwargs)
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.ready is not None:
+            self.ready.set_volume(volume)
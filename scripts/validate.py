@@ -0,0 +1,310 @@
+"""Checks every map of a folder on a process pool and reports what is in them and what looks wrong.
+
+usage: python -m scripts.validate [--jobs N] [--json] [maps or folders ...]   (default: data/maps)
+
+For each map: tile and off-grid counts per type, spawners, the bounding box of the grid, the connected
+regions of solid tiles and a list of issues: a missing or repeated player spawner, spawners inside walls or
+without ground below them, enemies and regions the player can't reach, and tiles whose variants don't match
+autotiling. Reachability is an estimate: the player is assumed to get anywhere by falling, and up to
+JUMP_HEIGHT_TILES up and JUMP_DISTANCE_TILES across by jumping off the ground or a wall, ignoring what is in
+between. Exits with status 1 when any map has issues or fails to load.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+"""The banner pygame prints on import would end up in the --json output"""
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from scripts import mapformat
+from scripts.tilemap import Tilemap, CHUNK_SIZE
+
+JUMP_HEIGHT_TILES = 3
+JUMP_DISTANCE_TILES = 4
+ENTITY_SIZE = (8, 15)
+MAX_LISTED = 5
+MAP_EXTENSIONS = (mapformat.JSON_EXTENSION, mapformat.BINARY_EXTENSION)
+
+
+def map_files(paths):
+    """Expands folders into the map files directly inside them; returns the sorted file paths."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in os.listdir(path)
+                      if os.path.splitext(name)[1] in MAP_EXTENSIONS]
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def solid_cells(tilemap):
+    """Returns the set of grid cells holding physics tiles, read from the chunks' solidity bitmaps."""
+    cells = set()
+    for key in tilemap.chunks:
+        x0, y0 = key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE
+        for row, bits in enumerate(tilemap.solid_rows(key)):
+            while bits:
+                low = bits & -bits
+                cells.add((x0 + low.bit_length() - 1, y0 + row))
+                bits ^= low
+    return cells
+
+
+def solid_runs(tilemap):
+    """Returns {grid row: [(first column, last column), ...]}, the horizontal runs of physics tiles of each row
+    from left to right, found by stitching the chunks' row bitmaps together.
+    """
+    if not tilemap.chunks:
+        return {}
+    left = min(cx for cx, cy in tilemap.chunks) * CHUNK_SIZE
+    rows = {}
+    for key in tilemap.chunks:
+        x0, y0 = key[0] * CHUNK_SIZE - left, key[1] * CHUNK_SIZE
+        for row, bits in enumerate(tilemap.solid_rows(key)):
+            if bits:
+                rows[y0 + row] = rows.get(y0 + row, 0) | bits << x0
+    runs = {}
+    for y, bits in rows.items():
+        row_runs = runs[y] = []
+        while bits:
+            first = (bits & -bits).bit_length() - 1
+            ones = bits >> first
+            length = (~ones & (ones + 1)).bit_length() - 1
+            row_runs.append((left + first, left + first + length - 1))
+            bits &= ~((1 << first + length) - 1)
+    return runs
+
+
+def regions(runs):
+    """Joins the runs of touching rows into 8-connected regions. Returns ({(row, run index): region}, sizes of the
+    regions indexed by region number).
+    """
+    parent = {}
+
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    for y, row_runs in runs.items():
+        for i in range(len(row_runs)):
+            parent[(y, i)] = (y, i)
+    for y, row_runs in runs.items():
+        below = runs.get(y + 1)
+        if not below:
+            continue
+        i = j = 0
+        while i < len(row_runs) and j < len(below):
+            first, last = row_runs[i]
+            below_first, below_last = below[j]
+            if below_first <= last + 1 and below_last >= first - 1:
+                a, b = find((y, i)), find((y + 1, j))
+                if a != b:
+                    parent[a] = b
+            if last < below_last:
+                i += 1
+            else:
+                j += 1
+
+    numbers = {}
+    labels = {}
+    sizes = []
+    for run in parent:
+        root = find(run)
+        if root not in numbers:
+            numbers[root] = len(sizes)
+            sizes.append(0)
+        labels[run] = numbers[root]
+        first, last = runs[run[0]][run[1]]
+        sizes[labels[run]] += last - first + 1
+    return labels, sizes
+
+
+def landing(solid, bottom, pos, tile_size):
+    """Returns the cell an entity spawned at a world position comes to rest in, or None if it falls out of
+    the map. The entity lands on the first physics tile below the column of its center.
+    """
+    x = int((pos[0] + ENTITY_SIZE[0] / 2) // tile_size)
+    for y in range(int(pos[1] // tile_size), bottom + 1):
+        if (x, y + 1) in solid:
+            return x, y
+    return None
+
+
+def reachable(solid, start):
+    """Returns the cells the player can get to from 'start' among those it can jump off: the empty cells on top
+    of physics tiles and, for wall jumps, the ones beside them.
+    """
+    supports = set()
+    for x, y in solid:
+        for cell in ((x, y - 1), (x - 1, y), (x + 1, y)):
+            if cell not in solid:
+                supports.add(cell)
+    columns = {}
+    for x, y in sorted(supports):
+        columns.setdefault(x, []).append(y)
+    seen = {start}
+    stack = [start]
+    while stack:
+        x, y = stack.pop()
+        for nx in range(x - JUMP_DISTANCE_TILES, x + JUMP_DISTANCE_TILES + 1):
+            column = columns.get(nx)
+            if column:
+                """Everything from JUMP_HEIGHT_TILES up downwards is reached; drop it so no cell is visited twice"""
+                i = bisect_left(column, y - JUMP_HEIGHT_TILES)
+                for ny in column[i:]:
+                    if (nx, ny) not in seen:
+                        seen.add((nx, ny))
+                        stack.append((nx, ny))
+                del column[i:]
+    return seen
+
+
+def autotile_mismatches(tilemap):
+    """Returns the cells whose variants autotiling would change."""
+    before = {key: chunk.variants.tobytes() for key, chunk in tilemap.chunks.items()}
+    tilemap.autotile()
+    cells = []
+    for key, chunk in tilemap.chunks.items():
+        after = chunk.variants.tobytes()
+        if after != before[key]:
+            for i in range(CHUNK_SIZE * CHUNK_SIZE):
+                if after[i * 2:i * 2 + 2] != before[key][i * 2:i * 2 + 2]:
+                    cells.append((key[0] * CHUNK_SIZE + i % CHUNK_SIZE, key[1] * CHUNK_SIZE + i // CHUNK_SIZE))
+    return sorted(cells)
+
+
+def listed(cells):
+    text = ', '.join(f'({x}, {y})' for x, y in cells[:MAX_LISTED])
+    return text + (', ...' if len(cells) > MAX_LISTED else '')
+
+
+def analyze(path):
+    """Loads one map and returns its report as a dict; a map that fails to load reports the error."""
+    start = time.perf_counter()
+    tilemap = Tilemap(None)
+    try:
+        tilemap.load(path)
+    except Exception as e:
+        return {'path': path, 'error': f'{type(e).__name__}: {e}', 'issues': [f'failed to load: {e}']}
+    size = tilemap.tile_size
+
+    tile_types = Counter()
+    for chunk in tilemap.chunks.values():
+        for type_id, tile_type in enumerate(tilemap.palette, 1):
+            tile_types[tile_type] += chunk.types.count(type_id)
+    offgrid = list(tilemap.offgrid_tiles)
+    players = [tile['pos'] for tile in offgrid if tile['type'] == 'spawners' and tile['variant'] == 0]
+    enemies = [tile['pos'] for tile in offgrid if tile['type'] == 'spawners' and tile['variant'] == 1]
+
+    solid = solid_cells(tilemap)
+    cells = list(tilemap.tile_positions())
+    bounds = None
+    if cells:
+        bounds = [min(x for x, y in cells), min(y for x, y in cells), max(x for x, y in cells),
+                  max(y for x, y in cells)]
+    runs = solid_runs(tilemap)
+    labels, region_sizes = regions(runs)
+
+    issues = []
+    if not players:
+        issues.append('no player spawner')
+    if len(players) > 1:
+        issues.append(f'{len(players)} player spawners, the last one wins')
+    bottom = bounds[3] if bounds else 0
+    landings = {}
+    for kind, positions in (('player', players), ('enemy', enemies)):
+        for pos in positions:
+            cell = (int(pos[0] // size), int(pos[1] // size))
+            if cell in solid:
+                issues.append(f'{kind} spawner inside a wall at {listed([cell])}')
+            landings[tuple(pos)] = landing(solid, bottom, pos, size)
+            if landings[tuple(pos)] is None:
+                issues.append(f'{kind} spawner at {listed([cell])} has no ground below it')
+
+    unreachable_regions = 0
+    if players and landings[tuple(players[-1])] is not None:
+        supports = reachable(solid, landings[tuple(players[-1])])
+        lost = sorted(landings[tuple(pos)] for pos in enemies
+                      if landings[tuple(pos)] is not None and landings[tuple(pos)] not in supports)
+        if lost:
+            issues.append(f'{len(lost)} enemies may be unreachable, standing at {listed(lost)}')
+        touched = {(x + dx, y + dy) for x, y in supports for dx, dy in ((0, 1), (-1, 0), (1, 0))} & solid
+        reached = set()
+        for x, y in touched:
+            row_runs = runs[y]
+            reached.add(labels[(y, bisect_right(row_runs, (x, math.inf)) - 1)])
+        unreachable_regions = len(region_sizes) - len(reached)
+        if unreachable_regions:
+            issues.append(f'{unreachable_regions} of {len(region_sizes)} solid regions may be unreachable')
+
+    mismatches = autotile_mismatches(tilemap)
+    if mismatches:
+        issues.append(f"{len(mismatches)} tiles don't match autotiling: {listed(mismatches)}")
+
+    return {
+        'path': path,
+        'tile_size': size,
+        'tiles': sum(tile_types.values()),
+        'tile_types': dict(sorted(tile_types.items())),
+        'offgrid': len(offgrid),
+        'offgrid_types': dict(sorted(Counter(tile['type'] for tile in offgrid).items())),
+        'spawners': {'player': len(players), 'enemy': len(enemies)},
+        'bounds': bounds,
+        'regions': len(region_sizes),
+        'region_sizes': sorted(region_sizes, reverse=True)[:MAX_LISTED],
+        'unreachable_regions': unreachable_regions,
+        'autotile_mismatches': len(mismatches),
+        'issues': issues,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def validate(files, jobs=None):
+    """Analyzes the map files on 'jobs' processes (all cores by default); returns the reports in order."""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(files) == 1:
+        return [analyze(path) for path in files]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(analyze, files, chunksize=max(1, len(files) // (jobs * 8))))
+
+
+def print_report(reports, seconds):
+    for report in reports:
+        if 'error' in report:
+            print(f"{report['path']}: {report['error']}")
+            continue
+        print(f"{report['path']}: {report['tiles']} tiles, {report['offgrid']} off-grid, "
+              f"{report['spawners']['enemy']} enemies, bounds {report['bounds']}, {report['regions']} regions")
+        for issue in report['issues']:
+            print(f'    {issue}')
+    failing = sum(1 for report in reports if report['issues'])
+    print(f'{len(reports)} maps checked in {seconds:.2f}s, {failing} with issues')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=[mapformat.MAP_FOLDER], help='map files or folders of maps')
+    parser.add_argument('--jobs', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reports = validate(map_files(args.paths), args.jobs)
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print_report(reports, time.perf_counter() - start)
+    return 1 if any(report['issues'] for report in reports) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())